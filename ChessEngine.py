@@ -3,7 +3,281 @@ This class is responsible for storing the information about the current state of
 responsible for determining the valid moves at the current state. It will also keep a move log.
 """
 
-import copy
+import random
+import sys
+from collections import OrderedDict
+
+'''
+Integer form of a square - next to the strings on the board every square is also kept as one small int with bit fields:
+bits 0-2 piece type (0 is no piece), bit 3 white, bit 4 black and bits 5-7 ability id (0 is no ability). Move
+generation tests these bits instead of slicing the strings. The Shanon-furniture barrier is not part of the squares,
+GameState keeps it as a bitmask of its own (barrierMask)
+'''
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 7
+WHITE = 8
+BLACK = 16
+COLOR_BITS = {'w': WHITE, 'b': BLACK}
+ABILITY_SHIFT = 5
+ABILITY_MASK = 7 << ABILITY_SHIFT
+ALL_SQUARES = (1 << 64) - 1 #bitmask with every square of the board
+PIECE_LETTERS = '-PNBRQK' #index is the piece type
+ABILITIES = ('Okonogi', 'Kanon', 'Shanon', 'Kraus', 'Shanon-furniture', 'Akasaka') #ability id is the index + 1
+ABILITY_NAMES = (None,) + ABILITIES + (None,) #index is the ability id
+PIECE_CODES = {"--": EMPTY, "": EMPTY} #string form -> integer form
+PIECE_STRINGS = {EMPTY: "--"} #integer form -> string form
+for color in 'wb':
+    for pieceType in range(PAWN, KING + 1):
+        for abilityId in range(len(ABILITIES) + 1):
+            code = COLOR_BITS[color] | pieceType | abilityId << ABILITY_SHIFT
+            PIECE_STRINGS[code] = color + PIECE_LETTERS[pieceType] + ('_' + ABILITIES[abilityId - 1] if abilityId else '')
+for code in PIECE_STRINGS:
+    PIECE_CODES[PIECE_STRINGS[code]] = code
+
+def pieceCode(piece):
+    return PIECE_CODES[piece]
+
+def pieceString(code):
+    return PIECE_STRINGS[code]
+
+'''
+name of the ability of the piece (None if it has none)
+'''
+def abilityName(code):
+    return ABILITY_NAMES[code >> ABILITY_SHIFT & 7]
+
+#same order as in checkForPinsAndChecks: 4 orthogonal directions first, then 4 diagonal ones
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, 1), (1, -1))
+KNIGHT_MOVES = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_MOVES = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = (0, 1, 2, 3) #up, left, down, right
+BISHOP_DIRECTIONS = (4, 7, 6, 5) #up-left, down-left, down-right, up-right - the order getBishopMoves walks them in
+
+'''
+Precomputed tables - built once at import, so the generators only look squares up (square = row * 8 + col)
+RAYS[sq][j] - the squares from sq (exclusive) to the edge of the board in DIRECTIONS[j], nearest first
+KNIGHT_SQUARES[sq], KING_SQUARES[sq] - the squares a knight or a king on sq jumps to, in KNIGHT_MOVES/KING_MOVES order
+RAY_MASKS[sq][j], KNIGHT_MASKS[sq] - the same squares as bitmasks (bit = square), to skip lines without a piece of a side
+'''
+RAYS = []
+for sq in range(64):
+    squareRays = []
+    for dRow, dCol in DIRECTIONS:
+        ray = []
+        r, c = sq // 8 + dRow, sq % 8 + dCol
+        while 0 <= r < 8 and 0 <= c < 8:
+            ray.append(r * 8 + c)
+            r, c = r + dRow, c + dCol
+        squareRays.append(tuple(ray))
+    RAYS.append(tuple(squareRays))
+
+KNIGHT_SQUARES = [tuple((sq // 8 + dRow) * 8 + sq % 8 + dCol for dRow, dCol in KNIGHT_MOVES
+                        if 0 <= sq // 8 + dRow < 8 and 0 <= sq % 8 + dCol < 8) for sq in range(64)]
+KING_SQUARES = [tuple((sq // 8 + dRow) * 8 + sq % 8 + dCol for dRow, dCol in KING_MOVES
+                      if 0 <= sq // 8 + dRow < 8 and 0 <= sq % 8 + dCol < 8) for sq in range(64)]
+RAY_MASKS = [tuple(sum(1 << endSq for endSq in ray) for ray in RAYS[sq]) for sq in range(64)]
+KNIGHT_MASKS = [sum(1 << endSq for endSq in KNIGHT_SQUARES[sq]) for sq in range(64)]
+
+'''
+AKASAKA_RAYS[sq] - (direction, walk) for the 8 directions Akasaka goes in, walk is a tuple of (square, wrapped).
+Going to the right she comes back from the left side after the wall; wrapped marks the squares her ability adds
+(counted like she always was: from the step where col + step reaches 8 on). A walk ends where it would leave the board
+or get back to sq
+'''
+AKASAKA_RAYS = []
+for sq in range(64):
+    r, c = sq // 8, sq % 8
+    walks = []
+    for d in ((-1, -1), (1, -1), (1, 1), (-1, 1), (-1, 0), (0, -1), (1, 0), (0, 1)):
+        walk = []
+        for i in range(1, 16): #can move max 15 squares
+            x = i if c + i < 8 else i - 8 #come from other side if came to a wall
+            endRow = r + d[0] * i
+            endCol = c + d[1] * x
+            if not (0 <= endRow < 8 and 0 <= endCol < 8) or endRow * 8 + endCol == sq:
+                break
+            walk.append((endRow * 8 + endCol, c + i >= 8))
+        walks.append((d, tuple(walk)))
+    AKASAKA_RAYS.append(tuple(walks))
+
+'''
+OKONOGI_STEPS[color][sq] - (square, direction) of the diagonal steps forward of an Okonogi pawn of that color on sq,
+the left one first
+'''
+OKONOGI_STEPS = {}
+for color, moveDirection in ((WHITE, -1), (BLACK, 1)):
+    OKONOGI_STEPS[color] = [tuple(((sq // 8 + moveDirection) * 8 + sq % 8 + dCol, (moveDirection, dCol)) for dCol in (-1, 1)
+                                  if 0 <= sq // 8 + moveDirection < 8 and 0 <= sq % 8 + dCol < 8) for sq in range(64)]
+
+'''
+Squares of a bitmask (bit = square), lowest first
+'''
+def maskSquares(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+'''
+BETWEEN[a][b] - bitmask (bit = square) of the squares strictly between squares a and b if they are on one line, else 0
+'''
+BETWEEN = [[0] * 64 for sq in range(64)]
+for sq in range(64):
+    for ray in RAYS[sq]:
+        mask = 0
+        for endSq in ray:
+            BETWEEN[sq][endSq] = mask
+            mask |= 1 << endSq
+
+'''
+Packed form of a move - one int instead of a Move object, so the move lists of the AI search are cheap to generate:
+bits 0-5 start square, bits 6-11 end square (square = row * 8 + col), bits 12-15 flags and from bit 16 on the integer
+form of the captured square. The move log keeps moves in this form too; a Move is only made out of one when the UI
+needs it (unpackMove, GameState.getLoggedMove)
+'''
+MOVE_CASTLE = 1 << 12
+MOVE_ENPASSANT = 1 << 13
+MOVE_PROMOTION = 1 << 14
+MOVE_CAPTURE = 1 << 15
+CAPTURED_SHIFT = 16
+
+def packMove(startSq, endSq, captured, flags=0):
+    if captured & TYPE_MASK or flags & MOVE_ENPASSANT:
+        flags |= MOVE_CAPTURE
+    return startSq | endSq << 6 | flags | captured << CAPTURED_SHIFT
+
+'''
+Makes the Move of a packed move, board has to be the one the move is played on
+'''
+def unpackMove(packed, board):
+    startSq = packed & 63
+    endSq = packed >> 6 & 63
+    return Move((startSq // 8, startSq % 8), (endSq // 8, endSq % 8), board, isEnpassantMove=bool(packed & MOVE_ENPASSANT),
+                isPawnPromotion=bool(packed & MOVE_PROMOTION), isCastleMove=bool(packed & MOVE_CASTLE))
+
+'''
+Castling rights as a bitmask, one bit for every side and wing
+'''
+CASTLE_WKS = 1
+CASTLE_BKS = 2
+CASTLE_WQS = 4
+CASTLE_BQS = 8
+
+'''
+Zobrist hashing - every part of a position gets its own random 64 bit number and the key of the whole position is the
+xor of the numbers of everything in it, so a change of the position only needs the changed parts to be xor-ed in/out.
+Seeded, so every process (e.g. the AI process) gets the same numbers
+'''
+zobristRandom = random.Random(20230512)
+zobristPieces = {EMPTY: [0] * 64} #key of the piece (with its ability) on each square, indexed by the integer form
+for code in PIECE_STRINGS:
+    if code != EMPTY:
+        zobristPieces[code] = [zobristRandom.getrandbits(64) for sq in range(64)]
+zobristBarrier = [zobristRandom.getrandbits(64) for sq in range(64)] #the square is inside the Shanon-furniture barrier
+zobristWhiteToMove = zobristRandom.getrandbits(64)
+zobristCastling = [0] #key of every castling rights bitmask
+for side in range(4):
+    sideKey = zobristRandom.getrandbits(64)
+    zobristCastling += [key ^ sideKey for key in zobristCastling]
+zobristEnpassant = [zobristRandom.getrandbits(64) for sq in range(64)]
+zobristOrdersAccess = {order: zobristRandom.getrandbits(64) for order in ('Krausw', 'Krausb', 'Shanon-furniturew', 'Shanon-furnitureb')}
+zobristBarrierStatus = [0] + [zobristRandom.getrandbits(64) for status in range(5)]
+zobristPackages = {name + color: [zobristRandom.getrandbits(64) for sq in range(64)] for name in ('Kanon', 'Shanon') for color in 'wb'}
+
+def zobristEnpassantKey(enpassantPossible):
+    return zobristEnpassant[enpassantPossible[0] * 8 + enpassantPossible[1]] if enpassantPossible else 0
+
+'''
+key of a package of squares Kanon threatened or Shanon protected (name is 'Kanon' or 'Shanon')
+'''
+def zobristPackageKey(name, package):
+    key = 0
+    for cords in package.cords:
+        key ^= zobristPackages[name + package.allyColor][cords[0] * 8 + cords[1]]
+    return key
+
+def zobristBarrierKey(barrierMask):
+    key = 0
+    for sq in maskSquares(barrierMask):
+        key ^= zobristBarrier[sq]
+    return key
+
+'''
+Evaluation - what every piece is worth (pieceScore) and how good every square is for it (piecePositionScores, in tenths
+of a pawn). GameState keeps both summed up over the board as running totals, white positive and black negative
+'''
+pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "P": 1}
+
+knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 1, 1, 1, 1, 1, 1, 1]]
+
+bishopScores = [[4, 3, 2, 1, 1, 2, 3, 4],
+                [3, 4, 3, 2, 2, 3, 4, 3],
+                [2, 3, 4, 3, 3, 4, 3, 2],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [2, 3, 4, 3, 3, 4, 3, 2],
+                [3, 4, 3, 2, 2, 3, 4, 3],
+                [4, 3, 2, 1, 1, 2, 3, 4]]
+
+queenScores = [[1, 1, 1, 3, 1, 1, 1, 1],
+               [1, 2, 3, 3, 3, 1, 1, 1],
+               [1, 4, 3, 3, 3, 4, 2, 1],
+               [1, 2, 3, 3, 3, 2, 2, 1],
+               [1, 2, 3, 3, 3, 2, 2, 1],
+               [1, 4, 3, 3, 3, 4, 2, 1],
+               [1, 1, 2, 3, 3, 1, 1, 1],
+               [1, 1, 1, 3, 1, 1, 1, 1]]
+
+rookScores = [[4, 3, 4, 4, 4, 4, 3, 4],
+              [4, 4, 4, 4, 4, 4, 4, 4],
+              [1, 1, 2, 3, 3, 2, 1, 1],
+              [1, 2, 3, 4, 4, 3, 2, 1],
+              [1, 2, 3, 4, 4, 3, 2, 1],
+              [1, 1, 2, 3, 3, 2, 1, 1],
+              [4, 4, 4, 4, 4, 4, 4, 4],
+              [4, 3, 4, 4, 4, 4, 3, 4]]
+
+whitePawnScores = [[8, 8, 8, 8, 8, 8, 8, 8],
+                   [8, 8, 8, 8, 8, 8, 8, 8],
+                   [5, 6, 6, 7, 7, 6, 6, 5],
+                   [2, 3, 3, 5, 5, 3, 3, 2],
+                   [1, 2, 3, 4, 4, 3, 2, 1],
+                   [1, 1, 2, 3, 3, 2, 1, 1],
+                   [1, 1, 1, 0, 0, 1, 1, 1],
+                   [0, 0, 0, 0, 0, 0, 0, 0]]
+
+blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
+                   [1, 1, 1, 0, 0, 1, 1, 1],
+                   [1, 1, 2, 3, 3, 2, 1, 1],
+                   [1, 2, 3, 4, 4, 3, 2, 1],
+                   [2, 3, 3, 5, 5, 3, 3, 2],
+                   [5, 6, 6, 7, 7, 6, 6, 5],
+                   [8, 8, 8, 8, 8, 8, 8, 8],
+                   [8, 8, 8, 8, 8, 8, 8, 8]]
+
+piecePositionScores = {"N": knightScores, "B": bishopScores, "R": rookScores,
+                       "Q": queenScores, "wP": whitePawnScores, "bP": blackPawnScores}
+
+MATERIAL_SCORES = {EMPTY: 0} #integer form -> material of the piece, negative for black
+POSITION_SCORES = {EMPTY: [0] * 64} #integer form -> positional score of the piece on each square, negative for black
+for code in PIECE_STRINGS:
+    if code != EMPTY:
+        piece = PIECE_STRINGS[code]
+        sign = 1 if code & WHITE else -1
+        MATERIAL_SCORES[code] = sign * pieceScore[piece[1]]
+        if piece[1] == 'K':
+            POSITION_SCORES[code] = [0] * 64
+        else:
+            table = piecePositionScores[piece[0:2] if piece[1] == 'P' else piece[1]]
+            POSITION_SCORES[code] = [sign * table[sq // 8][sq % 8] for sq in range(64)]
 
 class GameState():
     def __init__(self):
@@ -59,15 +333,28 @@ class GameState():
             ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
 
-        self.moveFunction = {'P': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves,
-                             'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        #the same board as integers (see pieceCode), flat - square (r, c) is at index r * 8 + c
+        self.squares = [pieceCode(piece) for row in self.board for piece in row]
+        #squares of the pieces of each side and of its pieces with an ability, bitmasks (bit = square) kept by setSquare
+        self.pieceSquares = {WHITE: 0, BLACK: 0}
+        self.abilitySquares = {WHITE: 0, BLACK: 0}
+        for sq in range(64):
+            piece = self.squares[sq]
+            if piece & TYPE_MASK:
+                self.pieceSquares[piece & (WHITE | BLACK)] |= 1 << sq
+                if piece & ABILITY_MASK:
+                    self.abilitySquares[piece & (WHITE | BLACK)] |= 1 << sq
+
+        self.moveFunction = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves,
+                             BISHOP: self.getBishopMoves, QUEEN: self.getQueenMoves, KING: self.getKingMoves}
         self.abilitiesFunction = {'Okonogi': self.Okonogi, 'Kanon': self.Kanon, 'Shanon': self.Shanon,
                                   'Kraus': self.Kraus, 'Shanon-furniture': self.ShanonFurniture, 'Akasaka': self.Akasaka}
         self.ordersFunction = {'Kraus': self.krausOrder, 'Shanon-furniture': self.shanonFurnitureOrder}
 
         self.WhiteToMove = True
-        self.moveLog = []
-        self.moveLogProp = []
+        self.moveLog = [] #packed moves (see packMove) and Orders
+        #one record per entry of moveLog with everything undoMove can't read back from the move itself (see getUndoRecord)
+        self.undoLog = []
 
         #variables concerning orders
         self.orderPlaced = False #flag variable to figure out if order was made and allow to execute it
@@ -84,107 +371,120 @@ class GameState():
 
         #enpassant variables
         self.enpassantPossible = () #coordinates for the square where en passant capture is possible
-        self.enpassantPossibleLog = [self.enpassantPossible]
 
         #castling variables
-        self.currentCastlingRights = CastleRights(True, True, True, True)
-        self.castleRightLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                            self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        self.currentCastlingRights = CASTLE_WKS | CASTLE_BKS | CASTLE_WQS | CASTLE_BQS
         #Kanon - Rook variables
-        self.currentKanonRook = [] #saving coordinates of threatened pieces both for white and black
-        self.currentKanonRookNr = None #the number of package from currentKanonRook
-        self.KanonRookSpecialMoveLog = []
-        self.KanonRookPermission = False
+        #packages are kept in tuples that get replaced instead of changed, so an undo record can just point at them
+        self.currentKanonRook = () #coordinates of the pieces threatened on the last turn of white and of black, one package each
 
         #Shanon - Rook variables
-        self.currentShanonRook = [] #same as Kanon
-        self.currentShanonRookNr = None
-        self.ShanonRookPermission = False
+        self.currentShanonRook = () #same as Kanon
 
         #Shanon - furniture - knight variables
-        self.shanonFurnitureBarrierStatus = 0
-        self.shanonFurnitureBarrierCords = []
+        self.shanonFurnitureBarrierStatus = 0 #countdown of the barrier, 0 is no barrier
+        self.barrierMask = 0 #squares inside the barrier (bit = square), see setBarrier
+
+        #64 bit key of the whole position, updated together with every change of it
+        self.zobristKey = self.computeZobristKey()
+
+        #material and positional score of the board (see MATERIAL_SCORES), running totals kept by setSquare
+        self.materialScore, self.positionScore = self.computeScores()
+
+        #move and order lists of positions seen before, keyed by zobristKey - assign a new MoveListCache to resize
+        self.moveCache = MoveListCache()
+        self.orderCache = MoveListCache(maxEntries=1000)
 
 
     '''
-    Takes a Move as a parameter and executes it (this will not work for castling, pawn promotion and en-passant, etc)
+    Takes a Move (or a packed move) as a parameter and executes it. The move is worked out and logged in its packed
+    form, getLoggedMove makes a Move of it when the UI needs one
     '''
     def makeMove(self, move):
-        if self.board[move.startRow][move.startCol][:-2] == "xx":
-            self.board[move.startRow][move.startCol] = "--xx"
-        else:
-            self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        if isinstance(move, Move):
+            move = move.packed
+        startSq, endSq = move & 63, move >> 6 & 63
+        moved = self.squares[startSq]
+        #en passant takes the pawn next to the start square, in the column of the end square
+        capturedSq = startSq - startSq % 8 + endSq % 8 if move & MOVE_ENPASSANT else endSq
+        self.undoLog.append(self.getUndoRecord(self.squares[capturedSq], moved))
+        #Kanon and Shanon pack their squares in the position the move is made from
+        self.updatePackages('w' if self.WhiteToMove else 'b')
+        self.putPiece(startSq, EMPTY)
+        self.putPiece(endSq, moved)
         self.moveLog.append(move) #log the move so we can undo it later
-        self.moveLogProp.append(move) #logging the move (without orders) for the drawMoveLog function in ChessMain
         self.WhiteToMove = not self.WhiteToMove #swap players
+        self.zobristKey ^= zobristWhiteToMove
         #update king's location
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if moved & TYPE_MASK == KING:
+            if moved & WHITE:
+                self.whiteKingLocation = (endSq // 8, endSq % 8)
+            else:
+                self.blackKingLocation = (endSq // 8, endSq % 8)
 
         #pawn promotion
-        if move.isPawnPromotion:
+        if move & MOVE_PROMOTION:
             global promotedPiece
             promotedPiece = 'Q' #input("Promote to Q, R, B or N:") #we can make this part of the ui later
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
+            self.putPiece(endSq, moved & (WHITE | BLACK) | QUEEN)
 
         #enpassant move
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = "--" #capturing the pawn after enpassanting
+        if move & MOVE_ENPASSANT:
+            self.putPiece(capturedSq, EMPTY) #capturing the pawn after enpassanting
 
         #update enpassantPossible variable
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2: #only on 2 square pawn advances
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.startCol)
+        self.zobristKey ^= zobristEnpassantKey(self.enpassantPossible)
+        if moved & TYPE_MASK == PAWN and abs(startSq - endSq) == 16: #only on 2 square pawn advances
+            self.enpassantPossible = ((startSq + endSq) // 16, startSq % 8)
         else:
             self.enpassantPossible = ()
-
-        self.enpassantPossibleLog.append(self.enpassantPossible)
+        self.zobristKey ^= zobristEnpassantKey(self.enpassantPossible)
 
         #castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2: #kingside castle move
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] #moves the rook
-                self.board[move.endRow][move.endCol+1] = '--' #erase old rook
+        if move & MOVE_CASTLE:
+            if endSq > startSq: #kingside castle move
+                self.putPiece(endSq - 1, self.squares[endSq + 1]) #moves the rook
+                self.putPiece(endSq + 1, EMPTY) #erase old rook
             else: #queenside castle move
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2] #moves the rook
-                self.board[move.endRow][move.endCol-2] = '--'  # erase old rook
+                self.putPiece(endSq + 1, self.squares[endSq - 2]) #moves the rook
+                self.putPiece(endSq - 2, EMPTY)  # erase old rook
 
         #update castling rights - whenever it is a rook or a king move
-        self.updateCastleRights(move)
-        self.castleRightLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
-                                                self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
-
-        #kanon - Rook special move access
-        if len(self.currentKanonRook) > 0:
-            for krsm in range(len(self.currentKanonRook)):
-                color = self.currentKanonRook[krsm].allyColor
-                if (color == 'w' and self.WhiteToMove) or (color == 'b' and not self.WhiteToMove):
-                    self.KanonRookPermission = True #after opponent makes a move and kanon was threatening someone
-                    # last turn then the permission + package and package number will be sent to Kanon ability function
-                    self.currentKanonRookNr = krsm
-                    break
+        self.zobristKey ^= zobristCastling[self.currentCastlingRights]
+        self.updateCastleRights(moved, self.undoLog[-1][0], startSq, endSq)
+        self.zobristKey ^= zobristCastling[self.currentCastlingRights]
 
-        #shanon - Rook special move access
-        if len(self.currentShanonRook) > 0:
-            for srsm in range(len(self.currentShanonRook)):
-                color = self.currentShanonRook[srsm].allyColor
-                if (color == 'w' and self.WhiteToMove) or (color == 'b' and not self.WhiteToMove):
-                    self.ShanonRookPermission = True #after opponent makes a move and shanon was protecting someone
-                    # last turn then the permission + package and package number will be sent to Shanon ability function
-                    self.currentShanonRookNr = srsm
-                    break
+        self.countDownBarrier()
 
-        #shanon - furniture barrier countdown
+    '''
+    shanon - furniture barrier countdown, once per turn
+    '''
+    def countDownBarrier(self):
+        self.zobristKey ^= zobristBarrierStatus[self.shanonFurnitureBarrierStatus]
         if self.shanonFurnitureBarrierStatus == 1:
             self.shanonFurnitureBarrierStatus = 0
-            for x in range(4):
-                cords = self.shanonFurnitureBarrierCords.pop()
-                self.board[cords[0]][cords[1]] = self.board[cords[0]][cords[1]][:-2]
-                print(self.board[cords[0]][cords[1]])
+            self.setBarrier(0)
         if self.shanonFurnitureBarrierStatus > 1:
             self.shanonFurnitureBarrierStatus -= 1
+        self.zobristKey ^= zobristBarrierStatus[self.shanonFurnitureBarrierStatus]
+
+    '''
+    The side to move passes (null move of the search). Everything a turn changes besides the board changes like in
+    makeMove: Kanon and Shanon pack their squares, the en passant square goes away and the barrier counts down.
+    Not logged in moveLog, undoNullMove takes it back
+    '''
+    def makeNullMove(self):
+        self.undoLog.append(self.getUndoRecord())
+        self.updatePackages('w' if self.WhiteToMove else 'b')
+        self.WhiteToMove = not self.WhiteToMove
+        self.zobristKey ^= zobristWhiteToMove
+        self.zobristKey ^= zobristEnpassantKey(self.enpassantPossible)
+        self.enpassantPossible = ()
+        self.countDownBarrier()
+
+    def undoNullMove(self):
+        self.WhiteToMove = not self.WhiteToMove
+        self.restoreUndoRecord(self.undoLog.pop())
 
     '''
     Undo the last move done
@@ -192,104 +492,367 @@ class GameState():
     def undoMove(self):
         if len(self.moveLog) != 0: #make sure that there is a move to undo
             move = self.moveLog.pop()
-            if len(str(move.moveID)) == 4: #if its a Move
-                self.board[move.startRow][move.startCol] = move.pieceMoved
-                self.board[move.endRow][move.endCol] = move.pieceCaptured
+            record = self.undoLog.pop()
+            captured, moved = record[0], record[1]
+            if not isinstance(move, Order): #a packed move
+                startSq, endSq = move & 63, move >> 6 & 63
+                #undo the castle move
+                if move & MOVE_CASTLE:
+                    if endSq > startSq: #kingside
+                        self.putPiece(endSq + 1, self.squares[endSq - 1]) #putting the rook back
+                        self.putPiece(endSq - 1, EMPTY)
+                    else: #queenside
+                        self.putPiece(endSq - 2, self.squares[endSq + 1]) #putting the rook back
+                        self.putPiece(endSq + 1, EMPTY)
+                self.putPiece(startSq, moved)
+                if move & MOVE_ENPASSANT: #gives the captured pawn back
+                    self.putPiece(endSq, EMPTY)
+                    self.putPiece(startSq - startSq % 8 + endSq % 8, captured)
+                else:
+                    self.putPiece(endSq, captured)
                 self.WhiteToMove = not self.WhiteToMove #switch turns back
                 # update king's location
-                if move.pieceMoved == "wK":
-                    self.whiteKingLocation = (move.startRow, move.startCol)
-                elif move.pieceMoved == "bK":
-                    self.blackKingLocation = (move.startRow, move.startCol)
-
-                #undo en passant
-                if move.isEnpassantMove:
-                    #gives the captured piece back
-                    if self.WhiteToMove:
-                        self.board[move.startRow][move.endCol] = 'bP'
+                if moved & TYPE_MASK == KING:
+                    if moved & WHITE:
+                        self.whiteKingLocation = (startSq // 8, startSq % 8)
                     else:
-                        self.board[move.startRow][move.endCol] = 'wP'
-                #reestablishing the enpassant move
-                self.enpassantPossibleLog.pop()
-                self.enpassantPossible = self.enpassantPossibleLog[-1]
-
-                #undo castling rights
-                self.castleRightLog.pop() #get rid of the latest castle rights
-                self.currentCastlingRights = copy.deepcopy(self.castleRightLog[-1]) #set the current castling rights to the last one in the list
-                #undo the castle move
-                if move.isCastleMove:
-                    if move.endCol - move.startCol == 2: #kingside
-                        self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1] #putting the rook back
-                        self.board[move.endRow][move.endCol-1] = '--'
-                    else: #queenside
-                        self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1] #putting the rook back
-                        self.board[move.endRow][move.endCol+1] = '--'
-
-                #undo kanon - rook special move
-                if len(self.KanonRookSpecialMoveLog) > 0:
-                    draftKanonRook = self.KanonRookSpecialMoveLog.pop()
-                    if draftKanonRook != 0:
-                        self.KanonRookPermission = True
-                        self.currentKanonRookNr = -1
-                        self.currentKanonRook.append(draftKanonRook)
-                    print(self.KanonRookSpecialMoveLog)
-
-                self.moveLogProp.pop()
-
-            elif len(str(move.moveID)) > 4: #if its an Order
+                        self.blackKingLocation = (startSq // 8, startSq % 8)
+            else: #if its an Order
                 self.undoOrder = True
-                self.ordersFunction[move.name](move.startRow, move.startCol, None)
+                self.ordersFunction[move.name](move.startRow, move.startCol, move)
+            self.restoreUndoRecord(record)
 
+    '''
+    The Move of entry i of moveLog, made for the UI (move log panel, animation, notation) only - the log itself keeps
+    packed moves, the piece moved comes from the undo record. Orders are given back as they are logged
+    '''
+    def getLoggedMove(self, i):
+        move = self.moveLog[i]
+        if isinstance(move, Order):
+            return move
+        startSq, endSq = move & 63, move >> 6 & 63
+        return Move((startSq // 8, startSq % 8), (endSq // 8, endSq % 8), None, bool(move & MOVE_ENPASSANT),
+                    bool(move & MOVE_PROMOTION), bool(move & MOVE_CASTLE), PIECE_STRINGS[self.undoLog[i][1]],
+                    PIECE_STRINGS[move >> CAPTURED_SHIFT])
 
+    '''
+    Puts back everything of an undo record (see getUndoRecord) but the captured and the moved piece
+    '''
+    def restoreUndoRecord(self, record):
+        castlingRights, enpassantPossible, barrierStatus, barrierMask, kanonRook, shanonRook, zobristKey = record[2:]
+        self.currentCastlingRights = castlingRights
+        self.enpassantPossible = enpassantPossible
+        self.shanonFurnitureBarrierStatus = barrierStatus
+        self.setBarrier(barrierMask) #back to the barrier from before the move or order, if it changed
+        self.currentKanonRook = kanonRook
+        self.currentShanonRook = shanonRook
+        self.zobristKey = zobristKey #everything is back, so is the key
+
+    '''
+    What makeMove/placeOrder changes besides the board, saved before they change it: the captured and the moved piece
+    (integer form, a promoted pawn can't be read back from the board), castling rights, en passant square, barrier
+    countdown with its squares, the Kanon and Shanon packages and the zobrist key
+    '''
+    def getUndoRecord(self, captured=EMPTY, moved=EMPTY):
+        return (captured, moved, self.currentCastlingRights, self.enpassantPossible, self.shanonFurnitureBarrierStatus,
+                self.barrierMask, self.currentKanonRook, self.currentShanonRook, self.zobristKey)
 
     '''
     Takes order as a parameter and sends it to function that will execute it
     '''
     def placeOrder(self, order):
+        self.undoLog.append(self.getUndoRecord())
         self.orderPlaced = True
         self.ordersFunction[order.name](order.startRow, order.startCol, order)
         self.moveLog.append(order)
 
 
     '''
-    Update the castle rights given the move
-    '''
-    def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRights.wks = False
-            self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRights.bks = False
-            self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0: #left rook
-                    self.currentCastlingRights.wqs = False
-                elif move.startCol == 7: #right rook
-                    self.currentCastlingRights.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0: #left rook
-                    self.currentCastlingRights.bqs = False
-                elif move.startCol == 7: #right rook
-                    self.currentCastlingRights.bks = False
-        elif move.pieceCaptured == 'wR': #if rook got captured
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRights.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRights.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRights.bks = False
+    Puts a piece (or "--") on the square; every change of the board goes through here (or putPiece) so that the integer
+    board and everything kept next to it stay in sync with the strings
+    '''
+    def setSquare(self, r, c, piece):
+        self.putPiece(r * 8 + c, PIECE_CODES[piece])
+
+    '''
+    setSquare with the square and the piece in integer form, what makeMove and undoMove use
+    '''
+    def putPiece(self, sq, code):
+        oldCode = self.squares[sq]
+        self.zobristKey ^= zobristPieces[oldCode][sq] ^ zobristPieces[code][sq]
+        self.materialScore += MATERIAL_SCORES[code] - MATERIAL_SCORES[oldCode]
+        self.positionScore += POSITION_SCORES[code][sq] - POSITION_SCORES[oldCode][sq]
+        self.squares[sq] = code
+        self.board[sq // 8][sq % 8] = PIECE_STRINGS[code]
+        if oldCode & TYPE_MASK:
+            self.pieceSquares[oldCode & (WHITE | BLACK)] &= ~(1 << sq)
+            if oldCode & ABILITY_MASK:
+                self.abilitySquares[oldCode & (WHITE | BLACK)] &= ~(1 << sq)
+        if code & TYPE_MASK:
+            self.pieceSquares[code & (WHITE | BLACK)] |= 1 << sq
+            if code & ABILITY_MASK:
+                self.abilitySquares[code & (WHITE | BLACK)] |= 1 << sq
+
+    '''
+    Puts the Shanon-furniture barrier on the squares of barrierMask (0 takes it away)
+    '''
+    def setBarrier(self, barrierMask):
+        if barrierMask != self.barrierMask:
+            self.zobristKey ^= zobristBarrierKey(self.barrierMask) ^ zobristBarrierKey(barrierMask)
+            self.barrierMask = barrierMask
+
+    '''
+    Squares on the other side of the barrier from sq (bit = square), 0 without a barrier. Nothing moves, attacks or looks
+    across the barrier, so the generators leave these squares out
+    '''
+    def getWall(self, sq):
+        if self.barrierMask >> sq & 1:
+            return ~self.barrierMask & ALL_SQUARES
+        return self.barrierMask
+
+    '''
+    Is sq attacked by a piece of color, looked at from sq outwards (pawn, knight and king squares, then the first piece
+    on each line) instead of generating the moves of the other side. ignoreSq is looked through as if empty - the king
+    that is about to step away doesn't hide the squares behind him. Like moves, attacks don't cross the barrier
+    '''
+    def squareAttacked(self, sq, color, ignoreSq=-1):
+        wall = self.getWall(sq)
+        r, c = sq // 8, sq % 8
+        #pawns of white attack upwards, so they stand one row below the square
+        pawnRow = r + 1 if color == WHITE else r - 1
+        if 0 <= pawnRow < 8:
+            for pawnCol in (c - 1, c + 1):
+                if 0 <= pawnCol < 8 and self.squares[pawnRow * 8 + pawnCol] & (color | TYPE_MASK) == color | PAWN and \
+                        not wall >> (pawnRow * 8 + pawnCol) & 1:
+                    return True
+        attackers = self.pieceSquares[color]
+        if KNIGHT_MASKS[sq] & attackers:
+            for startSq in KNIGHT_SQUARES[sq]:
+                if self.squares[startSq] & (color | TYPE_MASK) == color | KNIGHT and not wall >> startSq & 1:
+                    return True
+        for startSq in KING_SQUARES[sq]:
+            if self.squares[startSq] & (color | TYPE_MASK) == color | KING and not wall >> startSq & 1:
+                return True
+        rayMasks = RAY_MASKS[sq]
+        for j in range(8):
+            if not rayMasks[j] & attackers:
+                continue
+            for startSq in RAYS[sq][j]:
+                if wall >> startSq & 1: #the other side of the barrier
+                    break
+                piece = self.squares[startSq]
+                if piece == EMPTY or startSq == ignoreSq:
+                    continue
+                if piece & color:
+                    pieceType = piece & TYPE_MASK
+                    if pieceType == QUEEN or pieceType == (ROOK if j < 4 else BISHOP):
+                        return True
+                break
+        return False
+
+    '''
+    Squares the knights, bishops, rooks and queens of color reach - empty ones and the ones with an enemy piece, pins
+    and the barrier not looked at. Counted from the bitmasks (the first piece on a line is the lowest or the highest
+    bit of the line, depending on its direction) without generating moves, so the evaluation can afford it
+    '''
+    def getMobility(self, color):
+        allies = self.pieceSquares[color]
+        occupied = allies | self.pieceSquares[color ^ (WHITE | BLACK)]
+        mobility = 0
+        for sq in maskSquares(allies):
+            pieceType = self.squares[sq] & TYPE_MASK
+            if pieceType == KNIGHT:
+                mobility += bin(KNIGHT_MASKS[sq] & ~allies).count('1')
+            elif pieceType == BISHOP or pieceType == ROOK or pieceType == QUEEN:
+                rayMasks = RAY_MASKS[sq]
+                if pieceType == QUEEN:
+                    directions = range(8)
+                else:
+                    directions = ROOK_DIRECTIONS if pieceType == ROOK else BISHOP_DIRECTIONS
+                for j in directions:
+                    blockers = rayMasks[j] & occupied
+                    if not blockers:
+                        mobility += len(RAYS[sq][j])
+                        continue
+                    if RAYS[sq][j][0] > sq: #the line goes up the square numbers
+                        blocker = (blockers & -blockers).bit_length() - 1
+                    else:
+                        blocker = blockers.bit_length() - 1
+                    mobility += bin(BETWEEN[sq][blocker]).count('1') + (not allies >> blocker & 1)
+        return mobility
+
+    '''
+    Is the square attacked by the side that is not to move
+    '''
+    def squareUnderAttack(self, r, c):
+        return self.squareAttacked(r * 8 + c, BLACK if self.WhiteToMove else WHITE)
+
+    '''
+    Is the side to move in check, without generating any moves
+    '''
+    def kingInCheck(self):
+        kingRow, kingCol = self.whiteKingLocation if self.WhiteToMove else self.blackKingLocation
+        return self.squareUnderAttack(kingRow, kingCol)
+
+    '''
+    Computes the zobrist key of the position from scratch, makeMove/undoMove/placeOrder keep it up to date afterwards
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for sq in range(64):
+            key ^= zobristPieces[self.squares[sq]][sq]
+        if self.WhiteToMove:
+            key ^= zobristWhiteToMove
+        key ^= zobristCastling[self.currentCastlingRights]
+        key ^= zobristEnpassantKey(self.enpassantPossible)
+        for order in self.ordersAccess:
+            if self.ordersAccess[order]:
+                key ^= zobristOrdersAccess[order]
+        key ^= zobristBarrierStatus[self.shanonFurnitureBarrierStatus] ^ zobristBarrierKey(self.barrierMask)
+        for name, packages in (('Kanon', self.currentKanonRook), ('Shanon', self.currentShanonRook)):
+            for package in packages:
+                key ^= zobristPackageKey(name, package)
+        return key
+
+    '''
+    Material and positional score of the board from scratch, setSquare keeps them up to date afterwards
+    '''
+    def computeScores(self):
+        materialScore = positionScore = 0
+        for sq in maskSquares(self.pieceSquares[WHITE] | self.pieceSquares[BLACK]):
+            materialScore += MATERIAL_SCORES[self.squares[sq]]
+            positionScore += POSITION_SCORES[self.squares[sq]][sq]
+        return materialScore, positionScore
+
+    '''
+    Update the castle rights given the move: the pieces moved and captured (integer form) and its start and end squares
+    '''
+    def updateCastleRights(self, moved, captured, startSq, endSq):
+        if moved == WHITE | KING:
+            self.currentCastlingRights &= ~(CASTLE_WKS | CASTLE_WQS)
+        elif moved == BLACK | KING:
+            self.currentCastlingRights &= ~(CASTLE_BKS | CASTLE_BQS)
+        elif moved == WHITE | ROOK:
+            if startSq == 56: #left rook
+                self.currentCastlingRights &= ~CASTLE_WQS
+            elif startSq == 63: #right rook
+                self.currentCastlingRights &= ~CASTLE_WKS
+        elif moved == BLACK | ROOK:
+            if startSq == 0: #left rook
+                self.currentCastlingRights &= ~CASTLE_BQS
+            elif startSq == 7: #right rook
+                self.currentCastlingRights &= ~CASTLE_BKS
+        elif captured == WHITE | ROOK: #if rook got captured
+            if endSq == 56:
+                self.currentCastlingRights &= ~CASTLE_WQS
+            elif endSq == 63:
+                self.currentCastlingRights &= ~CASTLE_WKS
+        elif captured == BLACK | ROOK:
+            if endSq == 0:
+                self.currentCastlingRights &= ~CASTLE_BQS
+            elif endSq == 7:
+                self.currentCastlingRights &= ~CASTLE_BKS
 
     '''
     All moves considering checks
     '''
     def getValidMoves(self):
+        return [unpackMove(move, self.board) for move in self.getValidPackedMoves()]
+
+    '''
+    All moves considering checks as packed moves. Positions seen before are answered from moveCache, together with
+    inCheck, pins and checks that generating them would have set
+    '''
+    def getValidPackedMoves(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is None:
+            moves = self.generateValidPackedMoves()
+            packed = tuple(moves)
+            self.moveCache.put(self.zobristKey, (packed, self.inCheck, self.pins, self.checks), packed)
+            return moves
+        self.inCheck, self.pins, self.checks = entry[1:]
+        return list(entry[0])
+
+    '''
+    Is there any legal move in the position (sets inCheck like getValidPackedMoves). Stops at the first move found:
+    the king's moves are looked at first, then the pieces one by one, so checkmate and stalemate tests at the leaves of
+    the search don't generate whole move lists. In check the evasions are generated (and cached) as usual
+    '''
+    def hasAnyLegalMove(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is not None:
+            self.inCheck, self.pins, self.checks = entry[1:]
+            return len(entry[0]) > 0
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return len(self.getValidPackedMoves()) > 0
+        moves = []
+        kingRow, kingCol = self.whiteKingLocation if self.WhiteToMove else self.blackKingLocation
+        self.getKingMoves(kingRow, kingCol, moves)
+        if moves:
+            return True
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        for sq in maskSquares(self.pieceSquares[allyColor]):
+            piece = self.squares[sq]
+            if piece & TYPE_MASK != KING:
+                self.moveFunction[piece & TYPE_MASK](sq // 8, sq % 8, moves)
+            if piece & ABILITY_MASK:
+                self.abilitiesFunction[abilityName(piece)](sq // 8, sq % 8, moves)
+            if moves:
+                return True
+        return False
+
+    '''
+    Number of legal moves of the side to move (sets inCheck like getValidPackedMoves). The moves are counted in packed
+    form without making any Move objects, and a position looked at before is counted from the move cache without
+    copying its list; a new one goes in the cache, so the search takes its moves from there
+    '''
+    def countLegalMoves(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is not None:
+            self.inCheck, self.pins, self.checks = entry[1:]
+            return len(entry[0])
+        return len(self.getValidPackedMoves())
+
+    '''
+    Legal captures of the side to move as packed moves - en passant and the ability captures (Kanon and Shanon packages,
+    Akasaka wrapping round the board) included, sets inCheck like getValidPackedMoves. Out of check and without the
+    barrier only the moves to the enemy squares are generated (see generateCaptures), otherwise the captures are taken
+    from all the moves
+    '''
+    def getValidPackedCaptures(self):
+        entry = self.moveCache.get(self.zobristKey)
+        if entry is not None:
+            self.inCheck, self.pins, self.checks = entry[1:]
+            return [move for move in entry[0] if move & MOVE_CAPTURE]
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck or self.barrierMask:
+            return [move for move in self.getValidPackedMoves() if move & MOVE_CAPTURE]
+        return self.generateCaptures()
+
+    '''
+    Captures when not in check and there is no barrier, the pins of checkForPinsAndChecks have to be in self.pins
+    '''
+    def generateCaptures(self):
+        moves = []
+        kingRow, kingCol = self.whiteKingLocation if self.WhiteToMove else self.blackKingLocation
+        self.getKingMoves(kingRow, kingCol, moves)
+        pins = {pin[0] * 8 + pin[1]: (pin[2], pin[3]) for pin in self.pins}
+        allyColor, enemyColor = (WHITE, BLACK) if self.WhiteToMove else (BLACK, WHITE)
+        targets = self.pieceSquares[enemyColor]
+        if self.enpassantPossible:
+            targets |= 1 << (self.enpassantPossible[0] * 8 + self.enpassantPossible[1])
+        for endSq in maskSquares(targets):
+            self.getMovesTo(endSq, moves, pins)
+        self.pins = [] #abilities ignore pins, like in getCheckEvasions
+        for sq in maskSquares(self.abilitySquares[allyColor]):
+            self.abilitiesFunction[abilityName(self.squares[sq])](sq // 8, sq % 8, moves)
+        return [move for move in moves if move & MOVE_CAPTURE]
+
+    '''
+    Generates all moves considering checks, getValidPackedMoves caches them
+    '''
+    def generateValidPackedMoves(self):
         moves = []
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
         if self.WhiteToMove:
@@ -300,27 +863,16 @@ class GameState():
             kingCol = self.blackKingLocation[1]
         if self.inCheck:
             if len(self.checks) == 1: #only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
                 #to block a check you must move a piece into one of the squares between the enemy piece and king
-                check = self.checks[0] #check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol] #enemy piece causing the check
-                validSquares = [] #squares that pieces can move to
-                #if knight player must capture knight or move king
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
+                kingSq = kingRow * 8 + kingCol
+                checkSq = self.checks[0][0] * 8 + self.checks[0][1]
+                validSquares = BETWEEN[kingSq][checkSq] | 1 << checkSq #a knight or a piece next to the king has to be captured
+                if self.barrierMask: #the barrier changes the rules of every line, generate everything and filter
+                    moves = self.getAllPossibleMoves()
+                    #get rid of any moves that dont block check or move king
+                    moves = [move for move in moves if validSquares >> (move >> 6 & 63) & 1 or self.squares[move & 63] & TYPE_MASK == KING]
                 else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) #check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: #once you get to piece end checks
-                            break
-                #get rid of any moves that dont block check or move king
-                for i in range(len(moves) - 1, -1, -1): #go trough the list backwards when youre removing from a list as iterating
-                    if moves[i].pieceMoved[1] != 'K': #move doesnt move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: #move doesnt block check or capture piece
-                            moves.remove(moves[i])
+                    moves = self.getCheckEvasions(kingRow, kingCol, validSquares)
             else: #double check, king has to move
                 self.getKingMoves(kingRow, kingCol, moves)
         else: #not in check so all moves are fine
@@ -330,38 +882,126 @@ class GameState():
         return moves
 
     '''
-    All moves without considering checks
+    Moves out of a single check without generating the rest: the king's own moves plus moves of the other pieces onto
+    validSquares (the checking piece and the squares between it and the king). The normal moves are found backwards from
+    each of these squares; the few ability pieces generate their moves and only keep the ones ending on validSquares.
+    Only for positions without the barrier
     '''
-    def getAllPossibleMoves(self):
+    def getCheckEvasions(self, kingRow, kingCol, validSquares):
         moves = []
-        for r in range(len(self.board)): #number of rows
-            for c in range(len(self.board[r])): #number of cols in a given row
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.WhiteToMove) or (turn == 'b' and not self.WhiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunction[piece](r, c, moves) #calls the appropriate move function based on piece type
-                    if len(self.board[r][c]) > 4 and self.board[r][c][:-2] != '--':
-                        if self.board[r][c][-2:] == 'xx':
-                            pieceAbility = self.board[r][c][3:-2]
-                        else:
-                            pieceAbility = self.board[r][c][3:]
-                        self.abilitiesFunction[pieceAbility](r, c, moves) #calls the appropriate ability function based on piece type
+        self.getKingMoves(kingRow, kingCol, moves)
+        pins = {pin[0] * 8 + pin[1]: (pin[2], pin[3]) for pin in self.pins}
+        for endSq in maskSquares(validSquares):
+            self.getMovesTo(endSq, moves, pins)
+        #abilities ignore pins, like after the pieces' own moves used up their pins in getAllPossibleMoves
+        self.pins = []
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        abilityMoves = []
+        for sq in maskSquares(self.abilitySquares[allyColor]):
+            self.abilitiesFunction[abilityName(self.squares[sq])](sq // 8, sq % 8, abilityMoves)
+        moves.extend(move for move in abilityMoves if validSquares >> (move >> 6 & 63) & 1)
         return moves
 
     '''
-    All moves without considering checks
+    Normal moves (no king, no abilities) of the pieces of the side to move that can go to endSq, pins is a dict square ->
+    pin direction. Same rules as the get...Moves functions, just looked at from the end square
     '''
+    def getMovesTo(self, endSq, moves, pins):
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        endRow, endCol = endSq // 8, endSq % 8
+        endPiece = self.squares[endSq]
+        if self.WhiteToMove:
+            moveDirection, startRow, backRow = -1, 6, 0
+        else:
+            moveDirection, startRow, backRow = 1, 1, 7
+        flags = MOVE_PROMOTION if endRow == backRow else 0
+        #pawns
+        r = endRow - moveDirection
+        if 0 <= r < 8:
+            if endPiece == EMPTY:
+                startSq = r * 8 + endCol
+                piece = self.squares[startSq]
+                if piece & allyColor and piece & TYPE_MASK == PAWN:
+                    if startSq not in pins or pins[startSq] == (moveDirection, 0):
+                        moves.append(packMove(startSq, endSq, EMPTY, flags))
+                elif piece == EMPTY and r - moveDirection == startRow: #2 square pawn advance
+                    startSq -= 8 * moveDirection
+                    piece = self.squares[startSq]
+                    if piece & allyColor and piece & TYPE_MASK == PAWN:
+                        if startSq not in pins or pins[startSq] == (moveDirection, 0):
+                            moves.append(packMove(startSq, endSq, EMPTY))
+            for dCol in (-1, 1):
+                c = endCol - dCol
+                if 0 <= c < 8:
+                    startSq = r * 8 + c
+                    piece = self.squares[startSq]
+                    if piece & allyColor and piece & TYPE_MASK == PAWN:
+                        if startSq not in pins or pins[startSq] == (moveDirection, dCol):
+                            if endPiece != EMPTY:
+                                moves.append(packMove(startSq, endSq, endPiece, flags))
+                            elif (endRow, endCol) == self.enpassantPossible:
+                                kingRow, kingCol = self.whiteKingLocation if self.WhiteToMove else self.blackKingLocation
+                                attackingPiece, blockingPiece = self.enpassantPin(r, c, kingRow, kingCol, 0 if dCol == -1 else 1,
+                                                                                  allyColor ^ (WHITE | BLACK))
+                                if not attackingPiece or blockingPiece:
+                                    moves.append(packMove(startSq, endSq, EMPTY, MOVE_ENPASSANT))
+        allies = self.pieceSquares[allyColor]
+        #knights, a pinned knight can't move - the jumps from endSq backwards keep the move order of endSq - d
+        if KNIGHT_MASKS[endSq] & allies:
+            for startSq in reversed(KNIGHT_SQUARES[endSq]):
+                piece = self.squares[startSq]
+                if piece & allyColor and piece & TYPE_MASK == KNIGHT and startSq not in pins:
+                    moves.append(packMove(startSq, endSq, endPiece))
+        #rooks, bishops and queens - the first piece on each line from endSq, lines without an ally piece are skipped
+        rayMasks = RAY_MASKS[endSq]
+        for j in range(8):
+            if not rayMasks[j] & allies:
+                continue
+            d = DIRECTIONS[j]
+            for startSq in RAYS[endSq][j]:
+                piece = self.squares[startSq]
+                if piece == EMPTY:
+                    continue
+                pieceType = piece & TYPE_MASK
+                if piece & allyColor and (pieceType == QUEEN or pieceType == (ROOK if j < 4 else BISHOP)):
+                    if startSq not in pins or pins[startSq] == d or pins[startSq] == (-d[0], -d[1]):
+                        moves.append(packMove(startSq, endSq, endPiece))
+                break
 
+    '''
+    All moves without considering checks (packed)
+    '''
+    def getAllPossibleMoves(self):
+        moves = []
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        for sq in maskSquares(self.pieceSquares[allyColor]):
+            piece = self.squares[sq]
+            r, c = sq // 8, sq % 8
+            self.moveFunction[piece & TYPE_MASK](r, c, moves) #calls the appropriate move function based on piece type
+            if piece & ABILITY_MASK:
+                self.abilitiesFunction[abilityName(piece)](r, c, moves) #calls the appropriate ability function based on piece type
+        return moves
+
+    '''
+    All orders of the side to move, cached like the moves
+    '''
     def getAllPossibleOrders(self):
+        orders = self.orderCache.get(self.zobristKey)
+        if orders is None:
+            orders = self.generateAllPossibleOrders()
+            self.orderCache.put(self.zobristKey, tuple(orders))
+            return orders
+        return list(orders)
+
+    def generateAllPossibleOrders(self):
         orders = []
-        for r in range(len(self.board)):  # number of rows
-            for c in range(len(self.board[r])):  # number of cols in a given row
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.WhiteToMove) or (turn == 'b' and not self.WhiteToMove):
-                    if len(self.board[r][c]) > 2:
-                        piece = self.board[r][c][3:]
-                        if piece in self.ordersFunction:
-                            self.ordersFunction[piece](r, c, orders) #calls the appropriate order function based on piece
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        for sq in maskSquares(self.abilitySquares[allyColor]):
+            piece = self.squares[sq]
+            if not self.barrierMask >> sq & 1: #pieces inside the barrier can't give orders
+                ability = abilityName(piece)
+                if ability in self.ordersFunction:
+                    self.ordersFunction[ability](sq // 8, sq % 8, orders) #calls the appropriate order function based on piece
         return orders
 
     '''
@@ -381,48 +1021,51 @@ class GameState():
             moveDirection = -1
             startRow = 6
             backRow = 0
-            enemyColor = 'b'
+            enemyColor = BLACK
             kingRow, kingCol = self.whiteKingLocation
         else:
             moveDirection = 1
             startRow = 1
             backRow = 7
-            enemyColor = 'w'
+            enemyColor = WHITE
             kingRow, kingCol = self.blackKingLocation
         pawnPromotion = False #flag variable
 
-        block = True if self.board[r][c][-2:] == 'xx' else False #'xx' pieces are unable to move out of xx
+        wall = self.getWall(r * 8 + c) #pieces inside the barrier are unable to move out of it
+        aheadSq = (r + moveDirection) * 8 + c #square in front of the pawn
 
-        if (self.board[r+moveDirection][c] == "--" and not block) or (self.board[r+moveDirection][c] == "--xx" and block): #1 square pawn advance
-            #print(self.board[r+moveDirection][c])
+        if self.squares[aheadSq] == EMPTY and not wall >> aheadSq & 1: #1 square pawn advance, empty square on the same side of the barrier
             if not piecePinned or pinDirection == (moveDirection, 0): #pawn can move only when not pinned or if the direction matches
                 if r+moveDirection == backRow: #if piece gets to bank rank then it is a pawn promotion
                     pawnPromotion = True
-                moves.append(Move((r, c), (r+moveDirection, c), self.board, isPawnPromotion=pawnPromotion))
-                if r == startRow and self.board[r+2*moveDirection][c] == "--": #2 square pawn advance
-                    moves.append(Move((r, c), (r+2*moveDirection, c), self.board))
+                moves.append(packMove(r * 8 + c, aheadSq, EMPTY, MOVE_PROMOTION if pawnPromotion else 0))
+                #2 square pawn advance, never onto a barrier square
+                if r == startRow and self.squares[aheadSq + 8 * moveDirection] == EMPTY and not self.barrierMask >> (aheadSq + 8 * moveDirection) & 1:
+                    moves.append(packMove(r * 8 + c, aheadSq + 8 * moveDirection, EMPTY))
         if c-1 >= 0: #captures to the left
             if not piecePinned or pinDirection == (moveDirection, -1):
-                if (self.board[r + moveDirection][c - 1][-2:] != 'xx' and not block) or (self.board[r + moveDirection][c - 1][-2:] == 'xx' and block):
-                    if self.board[r+moveDirection][c-1][0] == enemyColor: #enemy piece to capture
+                endPiece = self.squares[aheadSq - 1]
+                if not wall >> (aheadSq - 1) & 1:
+                    if endPiece & enemyColor: #enemy piece to capture
                         if r+moveDirection == backRow:
                             pawnPromotion = True
-                        moves.append(Move((r, c), (r+moveDirection, c-1), self.board, isPawnPromotion=pawnPromotion))
+                        moves.append(packMove(r * 8 + c, aheadSq - 1, endPiece, MOVE_PROMOTION if pawnPromotion else 0))
                     elif (r+moveDirection, c-1) == self.enpassantPossible: #checking if its enpassant square
                         attackingPiece, blockingPiece = self.enpassantPin(r, c, kingRow, kingCol, 0, enemyColor)
                         if not attackingPiece or blockingPiece:
-                            moves.append(Move((r, c), (r+moveDirection, c-1), self.board, isEnpassantMove=True))
+                            moves.append(packMove(r * 8 + c, aheadSq - 1, endPiece, MOVE_ENPASSANT))
         if c+1 <= 7: #captures to the right
             if not piecePinned or pinDirection == (moveDirection, 1):
-                if (self.board[r + moveDirection][c + 1][:-2] != 'xx' and not block) or (self.board[r + moveDirection][c + 1][-2:] == 'xx' and block):
-                    if self.board[r+moveDirection][c+1][0] == enemyColor: #enemy piece to capture
+                endPiece = self.squares[aheadSq + 1]
+                if not wall >> (aheadSq + 1) & 1:
+                    if endPiece & enemyColor: #enemy piece to capture
                         if r+moveDirection == backRow:
                             pawnPromotion = True
-                        moves.append(Move((r, c), (r+moveDirection, c+1), self.board, isPawnPromotion=pawnPromotion))
+                        moves.append(packMove(r * 8 + c, aheadSq + 1, endPiece, MOVE_PROMOTION if pawnPromotion else 0))
                     elif (r+moveDirection, c+1) == self.enpassantPossible:
                         attackingPiece, blockingPiece = self.enpassantPin(r, c, kingRow, kingCol, 1, enemyColor)
                         if not attackingPiece or blockingPiece:
-                            moves.append(Move((r, c), (r+moveDirection, c+1), self.board, isEnpassantMove=True))
+                            moves.append(packMove(r * 8 + c, aheadSq + 1, endPiece, MOVE_ENPASSANT))
 
     '''
     Checking if after enpassanting your king is not exposed; in other words, if your enpassant isnt a pin
@@ -430,24 +1073,20 @@ class GameState():
     def enpassantPin(self, r, c, kingRow, kingCol, direction, enemyColor):
         attackingPiece = blockingPiece = False
         if kingRow == r:
-            if kingCol < c:  # king is left of the pawn
-                # inside between king and pawn; outside range between pawn border
-                insideRange = range(kingCol + 1, c - 1 + direction)
-                outsideRange = range(c + 1 + direction, 8)
-            else:  # king right of the pawn
-                insideRange = range(kingCol - 1, c + direction, -1)
-                outsideRange = range(c - 2 + direction, -1, -1)
-            for i in insideRange:
-                if self.board[r][i] != "--":  # some other piece beside enpassant pawn blocks
-                    blockingPiece = True
-                    break
-            for i in outsideRange:
-                square = self.board[r][i]
-                if square[0] == enemyColor and (square[1] == 'R' or square[1] == "Q"):  # attacking piece
-                    attackingPiece = True
-                    break
-                elif square != "--":
-                    blockingPiece = True
+            kingSq = kingRow * 8 + kingCol
+            pawnSq = r * 8 + c
+            capturedSq = pawnSq - 1 + 2 * direction
+            #along the row from the king, past both pawns to the border
+            for sq in RAYS[kingSq][3 if kingCol < c else 1]:
+                if sq == pawnSq or sq == capturedSq:
+                    continue
+                square = self.squares[sq]
+                if square != EMPTY or self.barrierMask >> sq & 1:
+                    if BETWEEN[kingSq][sq] >> pawnSq & 1 and square & enemyColor and \
+                            (square & TYPE_MASK == ROOK or square & TYPE_MASK == QUEEN): #attacking piece behind the pawns
+                        attackingPiece = True
+                    else: #some other piece blocks
+                        blockingPiece = True
                     break
         return attackingPiece, blockingPiece
 
@@ -461,31 +1100,34 @@ class GameState():
             if self.pins[i][0] == r and self.pins[i][1] == c:  # checking if this piece is being pinned
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q': #cant remove the queen from pin on rook moves, only remove it on bishop moves
+                if self.squares[r * 8 + c] & TYPE_MASK != QUEEN: #cant remove the queen from pin on rook moves, only remove it on bishop moves
                     self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
                 break
 
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
-
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) #up, left, down, right
-        enemyColor = "b" if self.WhiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8): #can move max 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if (endPiece == "--" and not block) or (endPiece == "--xx" and block): #empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor: #enemy piece valid
-                            if (endPiece[-2:] != 'xx' and not block) or (endPiece[-2:] == 'xx' and block):
-                                moves.append(Move((r, c), (endRow, endCol), self.board))
-                                break
-                        else: #friendly piece invalid
+        self.getSlidingMoves(r * 8 + c, ROOK_DIRECTIONS, piecePinned, pinDirection, moves)
+
+    '''
+    Moves along the rays of the given directions from sq up to the first piece, which is captured if it is an enemy.
+    Pieces are unable to move out of the barrier or into it
+    '''
+    def getSlidingMoves(self, sq, directions, piecePinned, pinDirection, moves):
+        enemyColor = BLACK if self.WhiteToMove else WHITE
+        wall = self.getWall(sq)
+        for j in directions:
+            d = DIRECTIONS[j]
+            if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
+                for endSq in RAYS[sq][j]:
+                    endPiece = self.squares[endSq]
+                    if wall >> endSq & 1: #the other side of the barrier, only enemy pieces there don't stop the line
+                        if not endPiece & enemyColor:
                             break
-                else: #off board
-                    break
+                    elif endPiece == EMPTY: #empty space valid
+                        moves.append(packMove(sq, endSq, endPiece))
+                    elif endPiece & enemyColor: #enemy piece valid
+                        moves.append(packMove(sq, endSq, endPiece))
+                        break
+                    else: #friendly piece invalid
+                        break
 
 
     '''
@@ -500,19 +1142,15 @@ class GameState():
                 self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
                 break
 
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
+        wall = self.getWall(r * 8 + c) #pieces inside the barrier are unable to move out of it
 
-        directions = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)) #all knight moves
-        allyColor = "w" if self.WhiteToMove else "b"
-        for d in directions:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: #check if is on board
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor: #not an ally piece (empty or enemy piece)
-                        if (endPiece[-2:] != 'xx' and not block) or (endPiece[-2:] == 'xx' and block):
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
+        allyColor = WHITE if self.WhiteToMove else BLACK
+        if not piecePinned:
+            for endSq in KNIGHT_SQUARES[r * 8 + c]:
+                endPiece = self.squares[endSq]
+                if not endPiece & allyColor: #not an ally piece (empty or enemy piece)
+                    if not wall >> endSq & 1:
+                        moves.append(packMove(r * 8 + c, endSq, endPiece))
     '''
     Get all the bishop moves for the bishop located at row, col and add those moves to the list
     '''
@@ -527,27 +1165,7 @@ class GameState():
                 self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
                 break
 
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
-
-        directions = ((-1, -1), (1, -1), (1, 1), (-1, 1))  # up-left, down-left, down-right, up-right
-        enemyColor = "b" if self.WhiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8): #can move max 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  #check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if (endPiece == "--" and not block) or (endPiece == "--xx" and block):  # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            if (endPiece[-2:] != 'xx' and not block) or (endPiece[-2:] == 'xx' and block):
-                                moves.append(Move((r, c), (endRow, endCol), self.board))
-                                break
-                        else:  # friendly piece invalid
-                            break
-                else:  # off board
-                    break
+        self.getSlidingMoves(r * 8 + c, BISHOP_DIRECTIONS, piecePinned, pinDirection, moves)
 
     '''
     Get all the queen moves for the queen located at row, col and add those moves to the list
@@ -562,53 +1180,42 @@ class GameState():
     '''
 
     def getKingMoves(self, r, c, moves):
-        directions = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))  # all king moves
         allyColor = "w" if self.WhiteToMove else "b"
-        for d in directions:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:  # check if is on board
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor:  # not an ally piece (empty or enemy piece)
-                    #place king on end square and check for checks
-                    self.checkAfterKingMove(r, c, endRow, endCol, allyColor, moves)
+        enemyColor = BLACK if self.WhiteToMove else WHITE
+        wall = self.getWall(r * 8 + c) #the king can't cross the barrier either
+        for endSq in KING_SQUARES[r * 8 + c]:
+            endPiece = self.squares[endSq]
+            if not endPiece & COLOR_BITS[allyColor] and not wall >> endSq & 1:  # not an ally piece (empty or enemy piece)
+                #king can't step into check, the line of a slider checking him goes on behind him
+                if not self.squareAttacked(endSq, enemyColor, r * 8 + c):
+                    moves.append(packMove(r * 8 + c, endSq, endPiece))
         self.getCastleMoves(r, c, moves, allyColor)
 
-    '''
-    a helping function to check if your king is in check after moving
-    '''
-    def checkAfterKingMove(self, r, c, endRow, endCol, allyColor, moves, castle=False):
-        if allyColor == 'w':
-            self.whiteKingLocation = (endRow, endCol)
-        else:
-            self.blackKingLocation = (endRow, endCol)
-        inCheck, pins, checks = self.checkForPinsAndChecks()
-        if not inCheck:
-            moves.append(Move((r, c), (endRow, endCol), self.board, isCastleMove=castle))
-        # place king back on original location
-        if allyColor == 'w':
-            self.whiteKingLocation = (r, c)
-        else:
-            self.blackKingLocation = (r, c)
-
     '''
     Generate all valid castle moves for the king at (r, c) and add them to the list of moves
     '''
     def getCastleMoves(self, r, c, moves, allyColor):
-        if self.checkForPinsAndChecks()[0]:
+        if self.squareUnderAttack(r, c):
             return #cant castle while we are in check
-        if (self.WhiteToMove and self.currentCastlingRights.wks) or (not self.WhiteToMove and self.currentCastlingRights.bks):
+        if self.currentCastlingRights & (CASTLE_WKS if self.WhiteToMove else CASTLE_BKS):
             self.getKingsideCastleMoves(r, c, moves, allyColor)
-        if (self.WhiteToMove and self.currentCastlingRights.wqs) or (not self.WhiteToMove and self.currentCastlingRights.bqs):
+        if self.currentCastlingRights & (CASTLE_WQS if self.WhiteToMove else CASTLE_BQS):
             self.getQueensideCastleMoves(r, c, moves, allyColor)
 
+    '''
+    the king can't castle through a square that is attacked
+    '''
     def getKingsideCastleMoves(self, r, c, moves, allyColor):
-        if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-            self.checkAfterKingMove(r, c, r, c+2, allyColor, moves, castle=True)
+        if c + 2 <= 7 and self.squares[r * 8 + c + 1] == EMPTY and self.squares[r * 8 + c + 2] == EMPTY and \
+                not self.barrierMask >> (r * 8 + c + 1) & 3:
+            if not self.squareUnderAttack(r, c + 1) and not self.squareUnderAttack(r, c + 2):
+                moves.append(packMove(r * 8 + c, r * 8 + c + 2, EMPTY, MOVE_CASTLE))
 
     def getQueensideCastleMoves(self, r, c, moves, allyColor):
-        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            self.checkAfterKingMove(r, c, r, c-2, allyColor, moves, castle=True)
+        if c - 3 >= 0 and self.squares[r * 8 + c - 1] == EMPTY and self.squares[r * 8 + c - 2] == EMPTY and self.squares[r * 8 + c - 3] == EMPTY and \
+                not self.barrierMask >> (r * 8 + c - 3) & 7:
+            if not self.squareUnderAttack(r, c - 1) and not self.squareUnderAttack(r, c - 2):
+                moves.append(packMove(r * 8 + c, r * 8 + c - 2, EMPTY, MOVE_CASTLE))
 
     '''
     Returns if the player is in check, a list of pins, and a list of checks
@@ -618,65 +1225,57 @@ class GameState():
         checks = [] #squares where enemy is applying a check
         inCheck = False
         if self.WhiteToMove:
-            enemyColor = "b"
-            allyColor = "w"
+            enemyColor = BLACK
+            allyColor = WHITE
             startRow = self.whiteKingLocation[0]
             startCol = self.whiteKingLocation[1]
         else:
-            enemyColor = "w"
-            allyColor = "b"
+            enemyColor = WHITE
+            allyColor = BLACK
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
+        kingSq = startRow * 8 + startCol
+        wall = self.getWall(kingSq) #pieces on the other side of the barrier can't reach the king
         #check outward from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, 1), (1, -1))
-        for j in range(len(directions)):
-            d = directions[j]
+        for j in range(8):
+            d = DIRECTIONS[j]
             possiblePin = () #reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[:-2] == 'xx':
+            for i, endSq in enumerate(RAYS[kingSq][j], 1):
+                if wall >> endSq & 1:
+                    break
+                endPiece = self.squares[endSq]
+                if endPiece & allyColor and endPiece & TYPE_MASK != KING: #prevent your king from protecting himself
+                    if possiblePin == (): #1st allied piece could be pinned
+                        possiblePin = (endSq // 8, endSq % 8, d[0], d[1])
+                    else: #2nd allied piece, so no pin or check possible in this dirrection
                         break
-                    if endPiece[0] == allyColor and endPiece[1] != 'K': #prevent your king from protecting himself
-                        if possiblePin == (): #1st allied piece could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else: #2nd allied piece, so no pin or check possible in this dirrection
+                elif endPiece & enemyColor:
+                    type = endPiece & TYPE_MASK
+                    #5 possibilities here in this complex conditional
+                    #1.) orthogonally away from king and piece is a rook
+                    #2.) diagonally away from king and piece is a bishop
+                    #3.) 1 square away diagonally from king and piece is a pawn
+                    #4.) any direction away from king and piece is a queen
+                    #5.) any direction 1 square away from king and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
+                    if (0 <= j <= 3 and type == ROOK) or \
+                            (4 <= j <= 7 and type == BISHOP) or \
+                            (i == 1 and type == PAWN and ((enemyColor == WHITE and 6 <= j <= 7) or (enemyColor == BLACK and 4 <= j <= 5))) or \
+                            (type == QUEEN) or (i == 1 and type == KING):
+                        if possiblePin == (): #no piece blocking so its check
+                            inCheck = True
+                            checks.append((endSq // 8, endSq % 8, d[0], d[1]))
                             break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        #5 possibilities here in this complex conditional
-                        #1.) orthogonally away from king and piece is a rook
-                        #2.) diagonally away from king and piece is a bishop
-                        #3.) 1 square away diagonally from king and piece is a pawn
-                        #4.) any direction away from king and piece is a queen
-                        #5.) any direction 1 square away from king and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == (): #no piece blocking so its check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else: #piece blocking so its pin
-                                pins.append(possiblePin)
-                                break
-                        else: #enemy piece not applying check
+                        else: #piece blocking so its pin
+                            pins.append(possiblePin)
                             break
-                else: #is outside the board
-                    break
+                    else: #enemy piece not applying check
+                        break
         #check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N': #enemy knight attacking king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        for endSq in KNIGHT_SQUARES[kingSq]:
+            endPiece = self.squares[endSq]
+            if endPiece & enemyColor and endPiece & TYPE_MASK == KNIGHT and not wall >> endSq & 1: #enemy knight attacking king
+                inCheck = True
+                checks.append((endSq // 8, endSq % 8, endSq // 8 - startRow, endSq % 8 - startCol))
         return inCheck, pins, checks
 
     """
@@ -697,134 +1296,94 @@ class GameState():
                 break
 
         if self.WhiteToMove:
-            moveDirection = -1
+            allyColor = WHITE
             backRow = 0
         else:
-            moveDirection = 1
+            allyColor = BLACK
             backRow = 7
-        pawnPromotion = False  # flag variable
-
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
 
-        if c-1 >= 0: #move to the left
-            if not piecePinned or pinDirection == (-1, -1):
-                if (self.board[r+moveDirection][c-1] == "--" and not block) or (self.board[r + moveDirection][c - 1] == "--xx" and block): #not ally piece
-                    if r+moveDirection == backRow:
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r+moveDirection, c-1), self.board, isPawnPromotion=pawnPromotion))
+        wall = self.getWall(r * 8 + c) #pieces inside the barrier are unable to move out of it
 
-        if c+1 <= 7: #move to the right
-            if not piecePinned or pinDirection == (moveDirection, 1):
-                if (self.board[r+moveDirection][c+1] == "--" and not block) or (self.board[r+moveDirection][c+1] == "--xx" and block): #not ally piece
-                    if r+moveDirection == backRow:
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r+moveDirection, c+1), self.board, isPawnPromotion=pawnPromotion))
+        for endSq, d in OKONOGI_STEPS[allyColor][r * 8 + c]: #diagonally forward, left then right
+            if not piecePinned or pinDirection == d:
+                if self.squares[endSq] == EMPTY and not wall >> endSq & 1: #empty square on the same side of the barrier
+                    moves.append(packMove(r * 8 + c, endSq, EMPTY, MOVE_PROMOTION if endSq // 8 == backRow else 0))
 
     '''
-    Kanon - Rook
+    Kanon - Rook: captures on the squares of the enemy pieces it threatened on the last turn (see updatePackages)
     '''
     def Kanon(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:  # checking if this piece is being pinned
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q':  # cant remove the queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
-                break
+        self.getPackageCaptures(r, c, moves, self.currentKanonRook)
+
+    '''
+    Shanon - Rook: captures on the squares of the ally pieces it protected on the last turn, if an enemy stands there now
+    '''
+    def Shanon(self, r, c, moves):
+        self.getPackageCaptures(r, c, moves, self.currentShanonRook)
 
+    '''
+    Moves of the rook at (r, c) to the squares in the package of the side to move that hold an enemy piece
+    '''
+    def getPackageCaptures(self, r, c, moves, packages):
         allyColor = 'w' if self.WhiteToMove else 'b'
-        enemyColor = "b" if self.WhiteToMove else "w"
-
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
-
-        if self.KanonRookPermission: #appending moves from the last turn
-            nop = self.currentKanonRookNr #number of package
-            if not piecePinned:
-                for move in range(self.currentKanonRook[nop].length): #unpacking the coordinates package
-                    cords = self.currentKanonRook[nop].cords[move]
-                    if self.board[cords[0]][cords[1]][0] == enemyColor:
-                        if (self.board[cords[0]][cords[1]][-2:] != 'xx' and not block) or (self.board[cords[0]][cords[1]][-2:] == 'xx' and block):
-                            moves.append(Move((r, c), cords, self.board))
-                #print(self.currentKanonRook)
-                self.currentKanonRook.remove(self.currentKanonRook[nop])
-        #print(self.currentKanonRookNr)
-        firstKanonRook = []
-        self.currentKanonRookNr = None
-        self.KanonRookPermission = False
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        for d in directions:
-            for i in range(1, 8):  # can move max 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":  # empty space valid
-                            continue
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            firstKanonRook.append((endRow, endCol)) #packing all our coordinates into one package
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:  # off board
-                    break
-        if len(firstKanonRook) > 0:
-            self.currentKanonRook.append(KanonShanonRookSpecialMove(firstKanonRook, allyColor)) #storing all packages
+        enemyColor = BLACK if self.WhiteToMove else WHITE
+        wall = self.getWall(r * 8 + c) #pieces inside the barrier are unable to move out of it
+        for package in packages:
+            if package.allyColor == allyColor: #unpacking the coordinates package of our last turn
+                for cords in package.cords:
+                    endPiece = self.squares[cords[0] * 8 + cords[1]]
+                    if endPiece & enemyColor and not wall >> (cords[0] * 8 + cords[1]) & 1:
+                        moves.append(packMove(r * 8 + c, cords[0] * 8 + cords[1], endPiece))
 
     '''
-    Shanon - Rook
+    Packs the squares of Kanon and Shanon of the side about to move, replacing the package of its last turn. Move
+    generation only reads the packages, makeMove keeps them and undoMove gets the old ones back from its record
     '''
-    def Shanon(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:  # checking if this piece is being pinned
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q':  # can't remove the queen from pin on rook moves
-                    self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
+    def updatePackages(self, allyColor):
+        kanonCords = []
+        shanonCords = []
+        ally = COLOR_BITS[allyColor]
+        for sq in maskSquares(self.abilitySquares[ally]):
+            ability = abilityName(self.squares[sq])
+            if ability == 'Kanon': #threatened enemy pieces
+                kanonCords += self.getPackedSquares(sq, ally ^ (WHITE | BLACK))
+            elif ability == 'Shanon': #protected ally pieces
+                shanonCords += self.getPackedSquares(sq, ally)
+        self.currentKanonRook = self.replacePackage('Kanon', self.currentKanonRook, kanonCords, allyColor)
+        self.currentShanonRook = self.replacePackage('Shanon', self.currentShanonRook, shanonCords, allyColor)
+
+    '''
+    Coordinates of the first piece on each line of the rook on sq, if it has the packedColor. Empty barrier squares stop
+    the lines too
+    '''
+    def getPackedSquares(self, sq, packedColor):
+        package = []
+        for j in ROOK_DIRECTIONS:
+            for endSq in RAYS[sq][j]:
+                endPiece = self.squares[endSq]
+                if endPiece == EMPTY and not self.barrierMask >> endSq & 1:
+                    continue
+                if endPiece & packedColor:
+                    package.append((endSq // 8, endSq % 8)) #packing all our coordinates into one package
                 break
+        return package
 
-        allyColor = 'w' if self.WhiteToMove else 'b'
-        enemyColor = "b" if self.WhiteToMove else "w"
-
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
-
-        if self.ShanonRookPermission:  # appending moves from the last turn
-            nop = self.currentShanonRookNr  # number of package
-            if not piecePinned:
-                for move in range(self.currentShanonRook[nop].length):  # unpacking the coordinates package
-                    cords = self.currentShanonRook[nop].cords[move]
-                    if self.board[cords[0]][cords[1]][0] == enemyColor:
-                        if (self.board[cords[0]][cords[1]][-2:] != 'xx' and not block) or (self.board[cords[0]][cords[1]][-2:] == 'xx' and block):
-                            moves.append(Move((r, c), cords, self.board))
-                #print(self.currentShanonRook)
-                self.currentShanonRook.remove(self.currentShanonRook[nop])
-        #print(self.currentShanonRookNr)
-        firstShanonRook = []
-        self.currentShanonRookNr = None
-        self.ShanonRookPermission = False
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        for d in directions:
-            for i in range(1, 8):  # can move max 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":  # empty space valid
-                            continue
-                        elif endPiece[0] == allyColor:  # enemy piece valid
-                            firstShanonRook.append((endRow, endCol))  # packing all our coordinates into one package
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:  # off board
-                    break
-        if len(firstShanonRook) > 0:
-            self.currentShanonRook.append(KanonShanonRookSpecialMove(firstShanonRook, allyColor)) #storing all packages
+    '''
+    packages with the one of allyColor replaced by a package of cords (none if cords is empty), zobrist key included
+    '''
+    def replacePackage(self, name, packages, cords, allyColor):
+        if not cords and not packages:
+            return packages
+        newPackages = ()
+        for package in packages:
+            if package.allyColor == allyColor:
+                self.zobristKey ^= zobristPackageKey(name, package)
+            else:
+                newPackages += (package,)
+        if cords:
+            newPackages += (KanonShanonRookSpecialMove(cords, allyColor),)
+            self.zobristKey ^= zobristPackageKey(name, newPackages[-1])
+        return newPackages
 
     '''
     Akasaka - Queen
@@ -839,52 +1398,22 @@ class GameState():
                 self.pins.remove(self.pins[i])  # removing the pin from pins for efficiency
                 break
 
-        enemyColor = "b" if self.WhiteToMove else "w"
-        block = True if self.board[r][c][-2:] == 'xx' else False  # 'xx' pieces are unable to move out of xx
-
-        directions = ((-1, -1), (1, -1), (1, 1), (-1, 1))  # up-left, down-left, down-right, up-right
-        for d in directions:
-            for i in range(1, 16):  # can move max 15 squares
-                x = i if c + i < 8 else i - 8 #come from other side if came to a wall
-                endRow = r + d[0] * i
-                endCol = c + d[1] * x
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if (endPiece == "--" and not block) or (endPiece == "--xx" and block):  # empty space valid
-                            if c + i >= 8: #only appending moves from his special ability
-                                moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            if (endPiece[-2:] != 'xx' and not block) or (endPiece[-2:] != 'xx' and block):
-                                if c + i >= 8:
-                                    moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:  # off board
-                    break
-
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))  # up, left, down, right
-        for d in directions:
-            for i in range(1, 16):  # can move max 15 squares
-                x = i if c + i < 8 else i - 8
-                endRow = r + d[0] * i
-                endCol = c + d[1] * x
-                if 0 <= endRow < 8 and 0 <= endCol < 8:  # check if is on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if (endPiece == "--" and not block) or (endPiece == "--xx" and block):  # empty space valid
-                            if c + i >= 8: #only appending moves from his special ability
-                                moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:  # enemy piece valid
-                            if (endPiece[-2:] != 'xx' and not block) or (endPiece[-2:] != 'xx' and block):
-                                if c + i >= 8:
-                                    moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:  # off board
-                    break
+        enemyColor = BLACK if self.WhiteToMove else WHITE
+        wall = self.getWall(r * 8 + c)  # pieces inside the barrier are unable to move out of it
+
+        for d, walk in AKASAKA_RAYS[r * 8 + c]:
+            if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
+                for endSq, wrapped in walk:
+                    endPiece = self.squares[endSq]
+                    if endPiece == EMPTY and not wall >> endSq & 1:  # empty space valid (on the same side of the barrier)
+                        if wrapped: #only appending moves from his special ability
+                            moves.append(packMove(r * 8 + c, endSq, endPiece))
+                    elif endPiece & enemyColor:  # enemy piece valid
+                        if not self.barrierMask >> endSq & 1 and wrapped:
+                            moves.append(packMove(r * 8 + c, endSq, endPiece))
+                        break
+                    else:  # friendly piece invalid
+                        break
 
     '''
     Kraus - pawn - does nothing other than his Order so we will skip this function
@@ -911,30 +1440,33 @@ class GameState():
     def krausOrder(self, r, c, orders):
         if self.WhiteToMove:
             moveDirection = -1
-            enemyColor = 'b'
+            enemyColor = BLACK
             allyColor = 'w'
         else:
             moveDirection = 1
-            enemyColor = 'w'
+            enemyColor = WHITE
             allyColor = 'b'
 
         #getValidOrders
         if not self.orderPlaced and self.ordersAccess['Kraus' + allyColor]:
-            if self.board[r+moveDirection][c][0] == enemyColor: #1 square pawn advance
-                if self.board[r + 2 * moveDirection][c] == "--" and self.board[r + moveDirection][c][1] != 'K':  # cant push king
-                    #can push only if square behind is empty
+            if 0 <= r + 2 * moveDirection < 8 and self.squares[(r + moveDirection) * 8 + c] & enemyColor: #1 square pawn advance, pushed piece has to stay on the board
+                pushSq = (r + 2 * moveDirection) * 8 + c
+                if self.squares[pushSq] == EMPTY and not self.barrierMask >> pushSq & 1 and self.squares[(r + moveDirection) * 8 + c] & TYPE_MASK != KING:  # cant push king
+                    #can push only if square behind is empty and not inside the barrier
                     orders.append(Order((r, c), (r+moveDirection, c), self.board, 'Kraus'))
         #Order itself
         elif self.ordersAccess['Kraus' + allyColor]:
-            self.board[r+2*moveDirection][c] = self.board[r+moveDirection][c] #enemy appears in new location
-            self.board[r+moveDirection][c] = "--" #deleting enemy from old location
+            self.setSquare(r+2*moveDirection, c, self.board[r+moveDirection][c]) #enemy appears in new location
+            self.setSquare(r+moveDirection, c, "--") #deleting enemy from old location
             self.ordersAccess['Kraus' + allyColor] = False
+            self.zobristKey ^= zobristOrdersAccess['Kraus' + allyColor]
             self.orderPlaced = False
         #undoing Order
         elif self.undoOrder:
-            self.board[r + moveDirection][c] = self.board[r+2*moveDirection][c] #get enemy back to its previous location
-            self.board[r + 2 * moveDirection][c] = "--" #remove him from the place he was before
+            self.setSquare(r + moveDirection, c, self.board[r+2*moveDirection][c]) #get enemy back to its previous location
+            self.setSquare(r + 2 * moveDirection, c, "--") #remove him from the place he was before
             self.ordersAccess['Kraus' + allyColor] = True #restore order access
+            self.zobristKey ^= zobristOrdersAccess['Kraus' + allyColor]
             self.undoOrder = False
 
     '''
@@ -954,32 +1486,29 @@ class GameState():
                     orders.append(Order((r, c), (row, col), self.board, 'Shanon-furniture'))
         # Order itself
         elif self.ordersAccess['Shanon-furniture' + allyColor]:
+            barrierMask = self.barrierMask
             for sq in squares:
-                self.board[orders.endRow + sq[0]][orders.endCol + sq[1]] += "xx"
-                self.shanonFurnitureBarrierCords.append((orders.endRow + sq[0], orders.endCol + sq[1]))
-                print(self.board[orders.endRow + sq[0]][orders.endCol + sq[1]])
+                barrierMask |= 1 << ((orders.endRow + sq[0]) * 8 + orders.endCol + sq[1])
+            self.setBarrier(barrierMask)
+            self.zobristKey ^= zobristBarrierStatus[self.shanonFurnitureBarrierStatus] ^ zobristBarrierStatus[4]
             self.shanonFurnitureBarrierStatus = 4
-            #self.shanonFurnitureBarrierCords.append(allyColor)
             self.ordersAccess['Shanon-furniture' + allyColor] = False
+            self.zobristKey ^= zobristOrdersAccess['Shanon-furniture' + allyColor]
             self.orderPlaced = False
         # undoing Order
-        elif self.undoOrder:
-            self.shanonFurnitureBarrierStatus += 1
+        elif self.undoOrder: #undoMove puts the countdown and the barrier back from its record
+            self.ordersAccess['Shanon-furniture' + allyColor] = True  # restore order access
+            self.zobristKey ^= zobristOrdersAccess['Shanon-furniture' + allyColor]
             self.undoOrder = False
-            if self.shanonFurnitureBarrierStatus == 5:
-                # allyColor = self.shanonFurnitureBarrierCords.pop()
-                self.shanonFurnitureBarrierStatus = 0
-                for x in range(4):
-                    cords = self.shanonFurnitureBarrierCords.pop()
-                    self.board[cords[0]][cords[1]] = self.board[cords[0]][cords[1]][:-2]
-                self.ordersAccess['Shanon-furniturew'] = True  # restore order access
-                self.ordersAccess['Shanon-furnitureb'] = True  # restore order access
 
 
 '''
 class responsible for move information
 '''
 class Move():
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'isEnpassantMove', 'isCastleMove', 'isCapture', 'moveID', 'packed')
+
     #maps keys to values
     #key : value
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4,
@@ -989,13 +1518,17 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isPawnPromotion=False, isCastleMove=False):
+    '''
+    pieceMoved and pieceCaptured are read from board unless given (a move of the log, when the board has moved on)
+    '''
+    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isPawnPromotion=False, isCastleMove=False,
+                 pieceMoved=None, pieceCaptured=None):
         self.startRow = startSq[0]
         self.startCol = startSq[1]
         self.endRow = endSq[0]
         self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
+        self.pieceMoved = board[self.startRow][self.startCol] if pieceMoved is None else pieceMoved
+        self.pieceCaptured = board[self.endRow][self.endCol] if pieceCaptured is None else pieceCaptured
 
         #pawn promotion
         self.isPawnPromotion = isPawnPromotion
@@ -1010,6 +1543,10 @@ class Move():
 
         self.isCapture = (self.pieceCaptured != '--') or self.isEnpassantMove
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        #the same move packed into an int (see packMove)
+        self.packed = packMove(self.startRow * 8 + self.startCol, self.endRow * 8 + self.endCol, PIECE_CODES[self.pieceCaptured],
+                               (MOVE_ENPASSANT if isEnpassantMove else 0) | (MOVE_PROMOTION if isPawnPromotion else 0) |
+                               (MOVE_CASTLE if isCastleMove else 0))
 
     '''
     Overriding the equals method
@@ -1019,6 +1556,9 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return hash(self.moveID)
+
 
     def getChessNotation(self):
         moveString = self.pieceMoved[1]
@@ -1044,6 +1584,8 @@ class Move():
 class responsible for Orders
 '''
 class Order():
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceOrdered', 'targetPiece', 'name', 'moveID')
+
     def __init__(self, startsQ, endSq, board, name):
         self.startRow = startsQ[0]
         self.startCol = startsQ[1]
@@ -1063,15 +1605,8 @@ class Order():
             return self.moveID == other.moveID
         return False
 
-'''
-castling class
-'''
-class CastleRights():
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+    def __hash__(self):
+        return hash(self.moveID)
 
 '''
 coordinates for the squares Kanon threatened last turn
@@ -1082,11 +1617,64 @@ class KanonShanonRookSpecialMove():
         self.length = len(cords)
         self.allyColor = allyColor
 
+'''
+LRU cache of generated lists keyed by the zobrist key of the position. Bounded by the number of entries and by an
+estimate of the memory the lists take; the least recently used entries are dropped first
+'''
+class MoveListCache():
+    def __init__(self, maxEntries=50000, maxMegabytes=64):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxMegabytes * 2 ** 20
+        self.entries = OrderedDict() #key -> (value, size in bytes)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
 
+    '''
+    items is the list of moves or orders in value (value itself by default), its size is what the entry is counted as
+    '''
+    def put(self, key, value, items=None):
+        if self.maxEntries <= 0:
+            return
+        if items is None:
+            items = value
+        size = sys.getsizeof(items) + sum(map(sys.getsizeof, items))
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while len(self.entries) > self.maxEntries or (self.bytes > self.maxBytes and len(self.entries) > 1):
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
 
+    '''
+    Pickled (a GameState sent to another process) the cache keeps its limits but not its entries, they are only worth
+    something in the process that filled them and would make every GameState sent grow with the game
+    '''
+    def __getstate__(self):
+        return {'maxEntries': self.maxEntries, 'maxBytes': self.maxBytes}
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.entries = OrderedDict()
+        self.bytes = self.hits = self.misses = 0
 
-
-
-
-
+    '''
+    hit/miss counters and the current size
+    '''
+    def getStats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hitRate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries), 'megabytes': self.bytes / 2 ** 20}
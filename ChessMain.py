@@ -5,7 +5,6 @@ main driver file. It will be responsible for handling user input and displaying
 import pygame as p
 import math as m
 from chess import ChessEngine, SmartMoveFinder
-from multiprocessing import Process, Queue
 
 BOARD_WIDTH = BOARD_HEIGHT = 512 #or 400
 MOVE_LOG_PANEL_WIDTH = 250
@@ -13,6 +12,8 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8 #dimensions of a chess board are 8x8
 SQ_SIZE = BOARD_WIDTH // DIMENSION
 MAX_FPS = 15 #for animations later on
+AI_WORKERS = 1 #processes the AI splits its root moves between, 1 is the single process search
+PONDER = True #the AI thinks on the human's time about the reply it expects
 IMAGES = {}
 
 '''
@@ -49,7 +50,7 @@ def main():
     playerOne = True #if a Human is playing white, then this will be true and false if AI is playing
     playerTwo = True #the same as above but for black
     AIThinking = False #if AI is thinking of a move so that we can still do things
-    moveFinderProcess = None #the process of thinking is done here
+    moveFinder = SmartMoveFinder.AIWorker(gs) #the process of thinking is done here, it follows every move of gs
     moveUndone = False #AI cant move while moveUndone
     showSpritesPress = False #flag variable for showing sprites by pressing once
     startingPhase = False #flag variable signifying starting phase
@@ -78,6 +79,7 @@ def main():
                                     if move == validMoves[i]:
                                         #print(move.getChessNotation(gs.board))
                                         gs.makeMove(validMoves[i])
+                                        moveFinder.makeMove(validMoves[i])
                                         moveMade = True
                                         animate = True
                                         sqSelected = ()
@@ -102,6 +104,7 @@ def main():
                                     if move == validMoves[i]:
                                         #print(move.getChessNotation(gs.board))
                                         gs.makeMove(validMoves[i])
+                                        moveFinder.makeMove(validMoves[i])
                                         moveMade = True
                                         animate = True
                                         sqSelected = ()
@@ -125,6 +128,7 @@ def main():
                                 for o in range(len(validOrders)):
                                     if order == validOrders[o]:
                                         gs.placeOrder(validOrders[o])
+                                        moveFinder.placeOrder(validOrders[o])
                                         moveMade = True
                                         sqSelectedO = ()
                                         playerClicksO = [] #reseting clicks
@@ -136,18 +140,20 @@ def main():
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # undo when 'z' is pressed
                     gs.undoMove()
+                    moveFinder.undoMove()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = True
                     animate = False
                     gameOver = False
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        moveFinder.cancel()
                         AIThinking = False
                     moveUndone = True
 
                 if e.key == p.K_r: #reset the board when 'r' is pressed
                     gs = ChessEngine.GameState()
+                    moveFinder.setPosition(gs)
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
@@ -155,9 +161,11 @@ def main():
                     animate = False
                     gameOver = False
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        moveFinder.cancel()
                         AIThinking = False
                     moveUndone = True
+                if e.key == p.K_m: #the AI plays the best move it has found so far when 'm' is pressed
+                    moveFinder.moveNow()
                 if e.key == p.K_x: #show sprites by pressing once
                     showSpritesPress = not showSpritesPress
         #key holding handlers
@@ -172,25 +180,31 @@ def main():
             if not AIThinking:
                 AIThinking = True
                 print("thinking...")
-                returnQueue = Queue() #used to pass data between threads
-                moveFinderProcess = Process(target=SmartMoveFinder.findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start() #call findBestMove(gs, validMoves, returnQueue)
+                moveFinder.startSearch(workers=AI_WORKERS)
 
-            if not moveFinderProcess.is_alive():
+            if moveFinder.poll():
                 print("done thinking")
-                AIMove = returnQueue.get()
-                if AIMove is None: #We dont really need that
-                    AIMove = SmartMoveFinder.findRandomMove(validMoves)
-                gs.makeMove(AIMove)
-                moveMade = True
-                animate = True
+                AIMove = None
+                for move in validMoves: #the worker answers with a packed move, the deepest it finished
+                    if move.packed == moveFinder.bestMove:
+                        AIMove = move
+                if AIMove is None: #not a legal move here, the worker's game is out of step - send it the game again
+                    print("no legal move from the AI, thinking again")
+                    moveFinder.setPosition(gs)
+                else:
+                    gs.makeMove(AIMove)
+                    moveFinder.makeMove(AIMove)
+                    if PONDER and ((gs.WhiteToMove and playerOne) or (not gs.WhiteToMove and playerTwo)): #a human answers
+                        moveFinder.ponder(workers=AI_WORKERS)
+                    moveMade = True
+                    animate = True
                 AIThinking = False
 
         if moveMade:
             if animate:
-                animateMove(gs.moveLog[-1], screen, gs.board, clock)
-                if len(gs.moveLog) > 0:
-                    print(gs.moveLog[-1].getChessNotation())
+                move = gs.getLoggedMove(-1) #the log keeps packed moves
+                animateMove(move, screen, gs.board, clock)
+                print(move.getChessNotation())
             validMoves = gs.getValidMoves()
             validOrders = gs.getAllPossibleOrders()
             moveMade = False
@@ -217,6 +231,7 @@ def main():
 
         clock.tick(MAX_FPS)
         p.display.flip()
+    moveFinder.close()
 
 
 '''
@@ -283,10 +298,9 @@ def highlightSquares(screen, gs, validMoves, sqSelected, validOrders, sqSelected
         b = p.Surface((SQ_SIZE * 2, SQ_SIZE * 2))
         b.set_alpha(100)  # transperancy value -> 0 transparent; 255 opaque
         b.fill(p.Color("red"))
-        sFBC = gs.shanonFurnitureBarrierCords[0]
-        #print(sFBC)
-        screen.blit(b, (sFBC[1] * SQ_SIZE, sFBC[0] * SQ_SIZE))
-        p.draw.rect(screen, 'red', p.Rect(sFBC[1] * SQ_SIZE, sFBC[0] * SQ_SIZE, SQ_SIZE * 2, SQ_SIZE * 2), 4)
+        sFBC = next(ChessEngine.maskSquares(gs.barrierMask)) #lowest square of the barrier is its top left corner
+        screen.blit(b, (sFBC % 8 * SQ_SIZE, sFBC // 8 * SQ_SIZE))
+        p.draw.rect(screen, 'red', p.Rect(sFBC % 8 * SQ_SIZE, sFBC // 8 * SQ_SIZE, SQ_SIZE * 2, SQ_SIZE * 2), 4)
 
 
 '''
@@ -295,11 +309,8 @@ draw the pieces on the board using the current GameState.board
 def drawPieces(screen, board, showSprites=False):
     for r in range(DIMENSION):
         for c in range(DIMENSION):
-            if showSprites and len(board[r][c]) > 4 and board[r][c][:-2] != '--':
-                if board[r][c][-2:] == 'xx':
-                    piece = board[r][c][3:-2]
-                else:
-                    piece = board[r][c][3:]
+            if showSprites and len(board[r][c]) > 4:
+                piece = board[r][c][3:]
             else:
                 piece = board[r][c][0:2]
             if piece != "--":
@@ -312,7 +323,8 @@ Draws the move log
 def drawMoveLog(screen, gs, font):
     moveLogRect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)
     p.draw.rect(screen, p.Color("black"), moveLogRect)
-    moveLog = gs.moveLogProp
+    #the log keeps packed moves, orders are not written in the log
+    moveLog = [gs.getLoggedMove(i) for i in range(len(gs.moveLog)) if not isinstance(gs.moveLog[i], ChessEngine.Order)]
     moveTexts = []
     for i in range(0, len(moveLog), 2): #going by 2 from 0 to one less than len(moveLog)
         moveStr = str(i//2 + 1) + ". " + moveLog[i].getChessNotation() + " "
@@ -353,7 +365,7 @@ def animateMove(move, screen, board, clock):
         endSquare = p.Rect(move.endCol*SQ_SIZE, move.endRow*SQ_SIZE, SQ_SIZE, SQ_SIZE)
         p.draw.rect(screen, color, endSquare)
         #draw the captured piece onto rectangle
-        if move.pieceCaptured != '--' and move.pieceCaptured != '--xx':
+        if move.pieceCaptured != '--':
             screen.blit(IMAGES[move.pieceCaptured[0:2]], endSquare)
         #draw moving piece
         screen.blit(IMAGES[move.pieceMoved[0:2]], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
@@ -2,154 +2,716 @@
 different AIs stored here
 """
 
-import random
-
-pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "P": 1}
-
-knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 1, 1, 1, 1, 1, 1, 1]]
-
-bishopScores = [[4, 3, 2, 1, 1, 2, 3, 4],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [4, 3, 2, 1, 1, 2, 3, 4]]
-
-queenScores = [[1, 1, 1, 3, 1, 1, 1, 1],
-               [1, 2, 3, 3, 3, 1, 1, 1],
-               [1, 4, 3, 3, 3, 4, 2, 1],
-               [1, 2, 3, 3, 3, 2, 2, 1],
-               [1, 2, 3, 3, 3, 2, 2, 1],
-               [1, 4, 3, 3, 3, 4, 2, 1],
-               [1, 1, 2, 3, 3, 1, 1, 1],
-               [1, 1, 1, 3, 1, 1, 1, 1]]
-
-rookScores = [[4, 3, 4, 4, 4, 4, 3, 4],
-              [4, 4, 4, 4, 4, 4, 4, 4],
-              [1, 1, 2, 3, 3, 2, 1, 1],
-              [1, 2, 3, 4, 4, 3, 2, 1],
-              [1, 2, 3, 4, 4, 3, 2, 1],
-              [1, 1, 2, 3, 3, 2, 1, 1],
-              [4, 4, 4, 4, 4, 4, 4, 4],
-              [4, 3, 4, 4, 4, 4, 3, 4]]
-
-whitePawnScores = [[8, 8, 8, 8, 8, 8, 8, 8],
-                   [8, 8, 8, 8, 8, 8, 8, 8],
-                   [5, 6, 6, 7, 7, 6, 6, 5],
-                   [2, 3, 3, 5, 5, 3, 3, 2],
-                   [1, 2, 3, 4, 4, 3, 2, 1],
-                   [1, 1, 2, 3, 3, 2, 1, 1],
-                   [1, 1, 1, 0, 0, 1, 1, 1],
-                   [0, 0, 0, 0, 0, 0, 0, 0]]
-
-blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
-                   [1, 1, 1, 0, 0, 1, 1, 1],
-                   [1, 1, 2, 3, 3, 2, 1, 1],
-                   [1, 2, 3, 4, 4, 3, 2, 1],
-                   [2, 3, 3, 5, 5, 3, 3, 2],
-                   [5, 6, 6, 7, 7, 6, 6, 5],
-                   [8, 8, 8, 8, 8, 8, 8, 8],
-                   [8, 8, 8, 8, 8, 8, 8, 8]]
-
-piecePositionScores = {"N": knightScores, "B": bishopScores, "R": rookScores,
-                       "Q": queenScores, "wP": whitePawnScores, "bP": blackPawnScores}
+import math
+import multiprocessing
+import sys
+import time
+from chess.ChessEngine import pieceScore, PIECE_LETTERS, TYPE_MASK, PAWN, KING, WHITE, BLACK, MOVE_CAPTURE, \
+    MOVE_PROMOTION, MOVE_ENPASSANT, CAPTURED_SHIFT, maskSquares
 
 CHECKMATE = 1000
+MATE_BOUND = CHECKMATE - 100 #scores past this are mates, CHECKMATE less the plies from the root to the mate
 STALEMATE = 0
-DEPTH = 3
+DEPTH = 3 #depth of the fixed depth searches
+MAX_DEPTH = 30 #findBestMove deepens up to this depth if the budgets let it
+TIME_BUDGET = 2000 #milliseconds findBestMove may think
+NODE_BUDGET = 300000 #positions findBestMove may search
+TT_MEGABYTES = 16 #size of the transposition table
+DELTA_MARGIN = 2 #a capture in the quiescence search has to be able to bring the score this close to alpha
+ASPIRATION_WINDOW = .5 #the root of the next depth is searched this far around the score of the last depth
+NULL_WINDOW = .01 #width of the null window searches, less than the smallest step of the scores (.05)
+NULL_MOVE_REDUCTION = 2 #the null move is searched this much shallower than the moves
+NULL_MOVE_MIN_DEPTH = 3 #no null move below this depth
+LMR_FULL_MOVES = 2 #moves of a node searched to the full depth before the late move reductions start
+LMR_MIN_DEPTH = 2 #no late move reductions below this depth
+LMR_DIVISOR = 2 #reduction of the i-th move at depth d is log(d) * log(i) / LMR_DIVISOR, see LMR_REDUCTIONS
+FUTILITY_MARGIN = 1.5 #per depth, quiet moves of a node this far below alpha at depth 1 or 2 aren't searched
+REVERSE_FUTILITY_MARGIN = 1.5 #per depth, a node at depth 3 or less this far above beta is cut off without a search
+MOBILITY_WEIGHT = .05 #score of each square a side's knights, bishops, rooks and queens reach (GameState.getMobility)
+WORKERS = 1 #processes findBestMoveParallel deals the root moves out to
+STOP_CHECK_NODES = 256 #the clock and the stop signal are looked at every this many nodes, a power of 2
+EXACT, LOWERBOUND, UPPERBOUND = 0, 1, 2 #what the score of a transposition table entry is
+MAX_MOVES = 64 #moves of a node told apart by LMR_REDUCTIONS, the later ones are reduced like the last of them
 
 '''
-Picks and returns a random move.
+LMR_REDUCTIONS[depth][i] - how much shallower the i-th move (from 0) of a node at depth is searched: nothing for the
+first LMR_FULL_MOVES moves and below LMR_MIN_DEPTH, and never past depth 0 (the quiescence search)
 '''
-def findRandomMove(validMoves):
-    if len(validMoves) > 1:
-        return validMoves[random.randint(0, len(validMoves)-1)]
-    else:
-        return validMoves[0]
-
-'''
-Find the best move based on material alone. (2 moves ahead)
-'''
-def findBestMove2(gs, validMoves):
-    turnMultiplier = -1 if gs.WhiteToMove else 1
-    opponentMinMaxScore = CHECKMATE
-    bestPlayerMove = None
-    random.shuffle(validMoves) #randomization of validMoves
-    for playerMove in validMoves:
-        gs.makeMove(playerMove) #doing a random move of our own
-        opponentsMoves = gs.getValidMoves()
-        opponentMaxScore = -CHECKMATE
-        if len(opponentsMoves) == 0 and not gs.inCheck:
-            opponentMaxScore = CHECKMATE  # prevention of stalemate
-        elif len(opponentsMoves) > 0:
-            for opponentsMove in opponentsMoves:
-                gs.makeMove(opponentsMove) #doing every enemy move for our move
-                #checking if enemy checkmates us
-                newValidMoves = gs.getValidMoves()
-                if len(newValidMoves) == 0:
-                    score = CHECKMATE - 1
-                else:
-                    score = turnMultiplier * scoreMaterial(gs.board)
-                if score > opponentMaxScore: #algoritm to find the most profitable move for enemy
-                    opponentMaxScore = score
-                gs.undoMove() #undoing enemy move
-        # algorithm to find the least harmful move, given the best enemy answers
-        if opponentMaxScore < opponentMinMaxScore:
-            opponentMinMaxScore = opponentMaxScore
-            bestPlayerMove = playerMove
-        gs.undoMove() #undoing our move
-    return bestPlayerMove
-
-'''
-Helper method to make first recursive call.
-'''
-def findBestMove(gs, validMoves, returnQueue):
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves) #we can get rid of it later
-    #findMoveMinMax(gs, validMoves, DEPTH, gs.WhiteToMove)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.WhiteToMove else -1)
-    returnQueue.put(nextMove)
+def buildReductions():
+    reductions = []
+    for depth in range(MAX_DEPTH + 1):
+        row = []
+        for i in range(MAX_MOVES):
+            if depth < LMR_MIN_DEPTH or i < LMR_FULL_MOVES:
+                row.append(0)
+            else:
+                row.append(min(depth - 1, max(1, int(math.log(depth) * math.log(i) / LMR_DIVISOR + .5))))
+        reductions.append(row)
+    return reductions
+
+
+LMR_REDUCTIONS = buildReductions()
+
+'''
+Transposition table: fixed number of buckets indexed by the zobrist key of the position, every bucket has a
+depth-preferred slot and an always-replace slot. Entries are (key, depth, bound, score, best packed move, age),
+the score is from the point of view of the side to move. newSearch ages the entries, so the ones left over from
+earlier searches give their depth-preferred slot up to anything new
+'''
+class TranspositionTable():
+    ENTRY_BYTES = sys.getsizeof((0,) * 6) + 3 * sys.getsizeof(2 ** 62) + 8 #the tuple, key, score and move, the slot
+
+    def __init__(self, megabytes=TT_MEGABYTES):
+        self.resize(megabytes)
+
+    '''
+    Drops every entry and makes the table take about megabytes
+    '''
+    def resize(self, megabytes):
+        self.megabytes = megabytes
+        self.buckets = max(1, int(megabytes * 2 ** 20) // (2 * self.ENTRY_BYTES))
+        self.clear()
+
+    def clear(self):
+        self.slots = [None] * (2 * self.buckets) #slot 2i is the depth-preferred one of bucket i, 2i + 1 always-replace
+        self.filled = 0
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    '''
+    Called before every search, entries of earlier searches can be overwritten from then on
+    '''
+    def newSearch(self):
+        self.age += 1
+
+    '''
+    The entry of the position or None
+    '''
+    def probe(self, key):
+        self.probes += 1
+        i = key % self.buckets * 2
+        for entry in (self.slots[i], self.slots[i + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        self.stores += 1
+        i = key % self.buckets * 2
+        entry = (key, depth, bound, score, move, self.age)
+        deep = self.slots[i]
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.age:
+            if deep is None:
+                self.filled += 1
+            elif deep[0] != key: #the deeper entry still gets the always-replace slot
+                self.replace(i + 1, deep)
+            self.slots[i] = entry
+            other = self.slots[i + 1]
+            if other is not None and other[0] == key: #no two entries of one position
+                self.slots[i + 1] = None
+                self.filled -= 1
+        else:
+            self.replace(i + 1, entry)
+
+    def replace(self, slot, entry):
+        if self.slots[slot] is None:
+            self.filled += 1
+        self.slots[slot] = entry
+
+    '''
+    hit rate of the probes and how full the table is
+    '''
+    def getStats(self):
+        return {'probes': self.probes, 'hits': self.hits, 'hitRate': self.hits / self.probes if self.probes else 0.0,
+                'stores': self.stores, 'entries': self.filled, 'fill': self.filled / len(self.slots),
+                'megabytes': self.megabytes}
+
+transpositionTable = TranspositionTable() #kept between the searches of the process
+
+'''
+A mate score of the search counts the plies from the root, the table keeps it counted from the position itself
+(the same position can be reached at another ply), scoreFromTable turns it back
+'''
+def scoreToTable(score, ply):
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
+
+'''
+Move ordering of the alpha-beta search, the moves most likely to cut the search off go first:
+the hash move (best move of the transposition table entry), then captures by MVV-LVA (most valuable victim, least
+valuable attacker, values from pieceScore) and promotions, then the two killer moves of the ply (quiet moves that
+cut off in a sibling node) and the other quiet moves by their history score (butterfly table, side x start x end
+square, raised by depth * depth on every cutoff). Ability captures (Kanon and Shanon packages, Akasaka wrapping
+round the board) carry their captured piece like any capture and are ranked with them.
+A king capture goes first among the captures of its victim: it is legal, so nothing defends the square
+'''
+class MoveOrdering():
+    HASH_MOVE = 1 << 30
+    CAPTURE = 1 << 20
+    KILLER = 1 << 19
+    HISTORY_LIMIT = 1 << 18 #history scores are halved once one gets here, so they stay below the killers
+    VALUES = [pieceScore.get(letter, 0) for letter in PIECE_LETTERS] #index is the piece type
+
+    def __init__(self, maxPly=MAX_DEPTH):
+        self.enabled = True #off leaves the moves in generation order, to compare node counts
+        self.maxPly = maxPly
+        self.clear()
+
+    def clear(self):
+        self.killers = [[None, None] for _ in range(self.maxPly + 1)]
+        self.history = [0] * (2 * 64 * 64) #index is side * 4096 + start square * 64 + end square
+
+    '''
+    Called before every search: the killers belong to the positions of the last search, history is only halved
+    '''
+    def newSearch(self):
+        self.killers = [[None, None] for _ in range(self.maxPly + 1)]
+        self.history = [score >> 1 for score in self.history]
+
+    def scoreMove(self, gs, move, ply, hashMove):
+        if move == hashMove:
+            return self.HASH_MOVE
+        score = self.scoreCapture(gs, move)
+        if score:
+            return score
+        killers = self.killers[ply]
+        if move == killers[0]:
+            return self.KILLER + 1
+        if move == killers[1]:
+            return self.KILLER
+        return self.history[(0 if gs.WhiteToMove else 4096) + (move & 4095)]
+
+    '''
+    MVV-LVA score of a capture or a promotion, 0 for any other move
+    '''
+    def scoreCapture(self, gs, move):
+        score = 0
+        if move & MOVE_CAPTURE:
+            attacker = gs.squares[move & 63] & TYPE_MASK
+            score = self.CAPTURE + self.VALUES[capturedType(move)] * 16 - self.VALUES[attacker]
+        if move & MOVE_PROMOTION:
+            score = max(score, self.CAPTURE) + self.VALUES[PAWN] * 16
+        return score
+
+    '''
+    moves sorted best first (a new list), ply is the distance from the root
+    '''
+    def orderMoves(self, gs, moves, ply, hashMove=None):
+        if not self.enabled:
+            return moves
+        return sorted(moves, key=lambda move: self.scoreMove(gs, move, ply, hashMove), reverse=True)
+
+    '''
+    moves of the quiescence search sorted by MVV-LVA only, quiet moves (evasions of a check) after the captures
+    '''
+    def orderCaptures(self, gs, moves):
+        if not self.enabled:
+            return moves
+        return sorted(moves, key=lambda move: self.scoreCapture(gs, move), reverse=True)
+
+    '''
+    A quiet move cut the search off at ply, remembered as a killer and in the history
+    '''
+    def addCutoff(self, gs, move, ply, depth):
+        if move & (MOVE_CAPTURE | MOVE_PROMOTION):
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        i = (0 if gs.WhiteToMove else 4096) + (move & 4095)
+        self.history[i] += depth * depth
+        if self.history[i] >= self.HISTORY_LIMIT:
+            self.history = [score >> 1 for score in self.history]
+
+moveOrdering = MoveOrdering() #kept between the searches of the process, like the transposition table
+
+'''
+State of one search: the depth of its root (searchDepth), its budgets, what it found (best move and score, principal
+variation, deepest finished depth), its counters, and the transposition table and move ordering it works with.
+Every search running at the same time needs its own context, the tables can be shared between contexts or kept one
+per game. reset starts the next search.
+stopSignal is anything with is_set (a threading or multiprocessing Event): once it is set the search stops like it
+does when the budgets run out and gives back its deepest finished depth. A ponder search (reset with ponder) has no
+time limit until ponderHitSignal, set the same way, tells it the move it ponders on was played; from then on its time
+budget counts from the start of the ponder search
+'''
+class SearchContext():
+    def __init__(self, table=None, ordering=None, searchDepth=DEPTH, stopSignal=None, ponderHitSignal=None):
+        self.transpositionTable = table if table is not None else TranspositionTable()
+        self.moveOrdering = ordering if ordering is not None else MoveOrdering()
+        self.stopSignal = stopSignal
+        self.ponderHitSignal = ponderHitSignal
+        self.reset()
+        self.searchDepth = searchDepth
+
+    '''
+    Forgets the last search and sets the budgets of the next one, timeBudget in milliseconds
+    '''
+    def reset(self, timeBudget=TIME_BUDGET, nodeBudget=NODE_BUDGET, ponder=False):
+        self.searchDepth = 0
+        self.nextMove = None #best packed move of the root being searched
+        self.bestMove = None #best Move of the deepest finished depth
+        self.bestScore = 0
+        self.principalVariation = []
+        self.completedDepth = 0
+        self.depthResults = [] #score, packed best move and principal variation of every finished depth, from depth 1
+        self.nodes = self.nullWindowSearches = self.researches = self.aspirationResearches = 0
+        self.nullMoveCutoffs = self.reductions = self.reductionResearches = 0
+        self.workerStats = [] #getStats of every worker of findBestMoveParallel
+        self.searchStopped = False
+        self.searchStart = time.perf_counter()
+        self.timeBudget = timeBudget
+        self.pondering = ponder
+        self.stopTime = float('inf') if ponder else self.searchStart + timeBudget / 1000
+        self.nodeLimit = nodeBudget
+
+    '''
+    Counts a node of the search and sets searchStopped once the budgets run out or the stop signal is set (never
+    during depth 1, so there is always a move to give back)
+    '''
+    def countNode(self):
+        self.nodes += 1
+        if self.searchDepth > 1 and (self.nodes >= self.nodeLimit or
+                                     self.nodes & (STOP_CHECK_NODES - 1) == 0 and self.limitReached()):
+            self.searchStopped = True
+        return self.searchStopped
+
+    '''
+    The clock ran out or the stop signal is set. A ponder hit starts the clock of a ponder search here
+    '''
+    def limitReached(self):
+        if self.pondering and self.ponderHitSignal is not None and self.ponderHitSignal.is_set():
+            self.pondering = False
+            self.stopTime = self.searchStart + self.timeBudget / 1000 #the time pondered counts as thought
+        return time.perf_counter() >= self.stopTime or self.stopSignal is not None and self.stopSignal.is_set()
+
+    '''
+    Statistics of the last search: the deepest finished depth and its score, nodes searched, how many null window
+    searches the principal variation search made and how many of them failed high and had to be searched again with
+    the full window, how many times the aspiration window was missed, how many nodes the null move cut off, how many
+    moves were reduced and how many of those were searched again, and the transposition table's statistics
+    '''
+    def getStats(self):
+        seconds = time.perf_counter() - self.searchStart
+        return {'depth': self.completedDepth, 'score': self.bestScore, 'nodes': self.nodes, 'seconds': seconds,
+                'nodesPerSecond': self.nodes / seconds if seconds else 0.0,
+                'nullWindowSearches': self.nullWindowSearches, 'researches': self.researches,
+                'aspirationResearches': self.aspirationResearches, 'nullMoveCutoffs': self.nullMoveCutoffs,
+                'reductions': self.reductions, 'reductionResearches': self.reductionResearches,
+                'principalVariation': list(self.principalVariation), 'workerStats': list(self.workerStats),
+                'transpositionTable': self.transpositionTable.getStats()}
+
+searchContext = SearchContext(transpositionTable, moveOrdering) #for the searches not given a context of their own
+
+'''
+type of the piece a packed capture takes (a pawn for en passant)
+'''
+def capturedType(move):
+    return PAWN if move & MOVE_ENPASSANT else move >> CAPTURED_SHIFT & TYPE_MASK
+
+'''
+Helper method to make first recursive call. The search works on packed moves (see ChessEngine.packMove),
+the Move given back is the one from validMoves. Everything the search finds and counts goes into context
+(searchContext when none is given), whose transposition table and move ordering it uses.
+Iterative deepening: depth 1, 2, 3... up to maxDepth are searched one after another until timeBudget (milliseconds)
+or nodeBudget runs out or the stop signal of context is set, a search stopped that way is thrown away. Every
+finished depth puts its move on returnQueue (if there is one), so the last move on the queue is the deepest answer.
+The next depth isn't started if it wouldn't finish in time, judging by how much the last depth grew over the one
+before. Depth 1 always finishes.
+From depth 2 on the root is searched in an aspiration window of ASPIRATION_WINDOW around the score of the last depth,
+a score falling outside of it is searched again with the window widened on that side.
+ponder searches on the opponent's time, see SearchContext.
+Returns the best Move and the principal variation (packed moves, the best move first) of the deepest finished depth
+'''
+def findBestMove(gs, validMoves, returnQueue, timeBudget=TIME_BUDGET, nodeBudget=NODE_BUDGET, maxDepth=MAX_DEPTH,
+                 context=None, ponder=False):
+    if context is None:
+        context = searchContext
+    context.reset(timeBudget, nodeBudget, ponder)
+    context.transpositionTable.newSearch()
+    context.moveOrdering.newSearch()
+    packedMoves = [move.packed for move in validMoves]
+    movesByPacked = {move.packed: move for move in validMoves} #packedMoves gets reordered, validMoves doesn't
+    score = 0
+    growth = max(2, len(packedMoves) ** .5) #guess of how many times bigger the next depth is, until two are known
+    turnMultiplier = 1 if gs.WhiteToMove else -1
+    for searchDepth in range(1, min(maxDepth, MAX_DEPTH) + 1):
+        context.searchDepth = searchDepth
+        depthStart, depthNodes = time.perf_counter(), context.nodes
+        if searchDepth > 1 and abs(score) < MATE_BOUND:
+            alpha, beta = score - ASPIRATION_WINDOW, score + ASPIRATION_WINDOW
+        else:
+            alpha, beta = -CHECKMATE, CHECKMATE
+        window = ASPIRATION_WINDOW
+        while True:
+            context.nextMove = None
+            pvLine = []
+            score = findMoveNegaMaxAlphaBeta(gs, packedMoves, searchDepth, 0, alpha, beta, turnMultiplier, context,
+                                             pvLine)
+            if context.searchStopped:
+                break
+            window *= 4
+            if score <= alpha and alpha > -CHECKMATE: #failed low, the score is only an upper bound
+                alpha = max(-CHECKMATE, score - window)
+            elif score >= beta and beta < CHECKMATE: #failed high, only a lower bound
+                beta = min(CHECKMATE, score + window)
+            else:
+                break
+            context.aspirationResearches += 1
+        if context.searchStopped:
+            break
+        nextMove = context.nextMove
+        context.completedDepth, context.bestScore = searchDepth, score
+        context.principalVariation = pvLine if pvLine[:1] == [nextMove] else \
+            [nextMove] if nextMove is not None else []
+        context.bestMove = movesByPacked[nextMove] if nextMove is not None else None
+        context.depthResults.append((score, nextMove, context.principalVariation))
+        if returnQueue is not None:
+            returnQueue.put(context.bestMove)
+        if nextMove is not None: #the best move so far is searched first at the next depth
+            packedMoves.remove(nextMove)
+            packedMoves.insert(0, nextMove)
+        if len(packedMoves) <= 1:
+            break
+        now = time.perf_counter()
+        depthNodes = context.nodes - depthNodes
+        if searchDepth > 1:
+            growth = max(2, depthNodes / max(1, previousNodes))
+        previousNodes = depthNodes
+        if context.limitReached() or now + (now - depthStart) * growth > context.stopTime or \
+                context.nodes + depthNodes * growth > context.nodeLimit:
+            break
+    return context.bestMove, context.principalVariation
+
+'''
+Parallel root search: the root moves, ordered, are dealt out round robin to the processes of the worker pool (see
+getWorkerPool), every one of them searches its share in its own copy of gs with findBestMove (the node budget is
+split between them). Every share has at least two moves, findBestMove doesn't go past depth 1 without a choice.
+Scores of different depths don't compare, so the shares are merged at the deepest depth all of them finished: the
+best score at that depth wins. The merged result goes into context: that depth, the nodes of all the workers together
+and every worker's statistics (workerStats).
+With one worker, or fewer than four moves, it is just findBestMove. Returns the best Move and its principal variation
+like findBestMove and puts the move on returnQueue (if there is one)
+'''
+def findBestMoveParallel(gs, validMoves, returnQueue=None, timeBudget=TIME_BUDGET, nodeBudget=NODE_BUDGET,
+                         maxDepth=MAX_DEPTH, workers=WORKERS, context=None, ponder=False):
+    if context is None:
+        context = searchContext
+    movesByPacked = {move.packed: move for move in validMoves}
+    shareCount = min(workers, len(movesByPacked) // 2)
+    if shareCount <= 1:
+        return findBestMove(gs, validMoves, returnQueue, timeBudget, nodeBudget, maxDepth, context, ponder)
+    context.reset(timeBudget, nodeBudget, ponder)
+    packedMoves = context.moveOrdering.orderMoves(gs, list(movesByPacked), 0)
+    shares = [[movesByPacked[move] for move in packedMoves[share::shareCount]] for share in range(shareCount)]
+    #every worker gets gs pickled, that is its own copy
+    results = getWorkerPool(workers, context).starmap(searchShare, [(gs, share, timeBudget, nodeBudget / shareCount,
+                                                                     maxDepth, ponder) for share in shares])
+    depth = min(len(depthResults) for depthResults, stats in results)
+    score, move, pv = max((depthResults[depth - 1] for depthResults, stats in results), key=lambda result: result[0])
+    context.bestScore, context.principalVariation = score, pv
+    context.bestMove = movesByPacked[move] if move is not None else None
+    context.workerStats = [stats for depthResults, stats in results]
+    context.completedDepth = depth
+    context.nodes = sum(stats['nodes'] for stats in context.workerStats)
+    if returnQueue is not None:
+        returnQueue.put(context.bestMove)
+    return context.bestMove, context.principalVariation
+
+workerPool = None #process pool of findBestMoveParallel, kept for the searches after
+workerPoolKey = None #the context and number of processes workerPool was started for
+
+'''
+The process pool of findBestMoveParallel. Started once and kept while the searches come with the same context and
+number of workers, so a search doesn't pay for starting the processes and every process keeps its copy of context,
+tables included, warm from one search to the next
+'''
+def getWorkerPool(workers, context):
+    global workerPool, workerPoolKey
+    if workerPool is None or workerPoolKey[0] is not context or workerPoolKey[1] != workers:
+        closeWorkerPool()
+        workerPool = multiprocessing.Pool(workers, initializer=startWorker, initargs=(context,))
+        workerPoolKey = (context, workers)
+    return workerPool
+
+def closeWorkerPool():
+    global workerPool, workerPoolKey
+    if workerPool is not None:
+        workerPool.terminate()
+        workerPool.join()
+        workerPool = workerPoolKey = None
+
+'''
+Runs once in every worker process of findBestMoveParallel, context is the worker's copy of the parent's
+'''
+def startWorker(context):
+    global workerContext
+    workerContext = context
+
+'''
+What a worker of findBestMoveParallel runs: findBestMove over its share of the root moves. Gives back the result of
+every depth it finished (SearchContext.depthResults, scores from the side to move's point of view) and the search
+statistics
+'''
+def searchShare(gs, validMoves, timeBudget, nodeBudget, maxDepth, ponder):
+    findBestMove(gs, validMoves, None, timeBudget, nodeBudget, maxDepth, workerContext, ponder)
+    return workerContext.depthResults, workerContext.getStats()
+
+'''
+Searches gs to depth with findBestMove and then with findBestMoveParallel, both without time or node limit and with
+empty tables, and returns how long each one took, their nodes and the speedup of the parallel one. The pool is
+started before the clock and closed after
+'''
+def measureParallelSpeedup(gs, depth, workers=WORKERS):
+    validMoves = gs.getValidMoves()
+    context = SearchContext()
+    start = time.perf_counter()
+    findBestMove(gs, list(validMoves), None, float('inf'), float('inf'), depth, context)
+    singleSeconds, singleNodes = time.perf_counter() - start, context.nodes
+    context = SearchContext()
+    getWorkerPool(workers, context)
+    start = time.perf_counter()
+    findBestMoveParallel(gs, list(validMoves), None, float('inf'), float('inf'), depth, workers, context)
+    parallelSeconds = time.perf_counter() - start
+    closeWorkerPool()
+    return {'depth': depth, 'workers': workers, 'singleSeconds': singleSeconds, 'parallelSeconds': parallelSeconds,
+            'singleNodes': singleNodes, 'parallelNodes': context.nodes,
+            'speedup': singleSeconds / parallelSeconds if parallelSeconds else 0.0}
+
+'''
+Searches gs to depth with findBestMove (no time or node limit, empty tables) and times making and undoing every valid
+move of gs, what each searched node pays for. Returns the nodes, microseconds per searched node and per make+undo
+'''
+def measureNodeCost(gs, depth, repeat=100):
+    validMoves = gs.getValidMoves()
+    context = SearchContext()
+    start = time.perf_counter()
+    findBestMove(gs, list(validMoves), None, float('inf'), float('inf'), depth, context)
+    searchSeconds = time.perf_counter() - start
+    packedMoves = gs.getValidPackedMoves()
+    start = time.perf_counter()
+    for i in range(repeat):
+        for move in packedMoves:
+            gs.makeMove(move)
+            gs.undoMove()
+    makeUndoSeconds = time.perf_counter() - start
+    return {'depth': depth, 'nodes': context.nodes,
+            'microsecondsPerNode': searchSeconds / context.nodes * 1e6 if context.nodes else 0.0,
+            'microsecondsPerMakeUndo': makeUndoSeconds / (repeat * len(packedMoves)) * 1e6 if packedMoves else 0.0}
+
+'''
+Statistics of the last search of context (searchContext when none is given), see SearchContext.getStats
+'''
+def getSearchStats(context=None):
+    return (context if context is not None else searchContext).getStats()
+
+'''
+The AI as a long-lived process, so a move doesn't pay for starting a process and pickling the whole GameState, and
+the transposition table and move ordering stay warm from one move to the next. The worker keeps its own copy of the
+game in step with small messages (packed moves, see runWorker); the whole GameState is only sent at the start and
+when the game is replaced. moveNow and cancel set the stop signal of the worker's searches (see SearchContext),
+the search gives back its deepest finished depth within STOP_CHECK_NODES nodes; cancel drops that answer.
+Pondering: once the AI has moved, ponder searches the position after the reply the principal variation predicts
+while the opponent thinks. If the opponent plays it (a ponder hit) that search goes on as the AI's next search,
+with the time pondered counted as thought, otherwise it is cancelled and the next search starts with the tables
+it warmed up. Anything else done to the game (undo, orders, a new game) cancels it too
+'''
+class AIWorker():
+    def __init__(self, gs):
+        self.connection, workerConnection = multiprocessing.Pipe()
+        self.stopSignal = multiprocessing.Event()
+        self.ponderHitSignal = multiprocessing.Event()
+        #not a daemon, findBestMoveParallel starts processes of its own
+        self.process = multiprocessing.Process(target=runWorker,
+                                               args=(workerConnection, self.stopSignal, self.ponderHitSignal))
+        self.process.start()
+        self.searchId = 0
+        self.answeredId = 0 #searchId of the last answer read
+        self.searching = False
+        self.ponderMove = None #packed reply the worker is pondering on
+        self.ponderHit = False #the reply was played, the ponder search is the next search
+        self.bestMove = None #packed move of the last search answered
+        self.principalVariation = []
+        self.setPosition(gs)
+
+    '''
+    A new game (or a game changed in a way the other messages don't cover)
+    '''
+    def setPosition(self, gs):
+        self.cancel()
+        self.connection.send(('position', gs))
+
+    def makeMove(self, move):
+        if self.ponderMove is not None and move.packed == self.ponderMove:
+            self.ponderHitSignal.set()
+            self.ponderMove, self.ponderHit = None, True
+        else:
+            self.cancel()
+        self.connection.send(('move', move.packed))
+
+    def placeOrder(self, order):
+        self.cancel()
+        self.connection.send(('order', order))
+
+    def undoMove(self):
+        self.cancel()
+        self.connection.send(('undo',))
+
+    '''
+    Starts a search of the position of the worker, poll tells when it is done. After a ponder hit the ponder search
+    (with its own budgets) is the search
+    '''
+    def startSearch(self, timeBudget=TIME_BUDGET, nodeBudget=NODE_BUDGET, workers=WORKERS):
+        if self.ponderHit:
+            self.ponderHit = False
+            self.searching = True
+            return
+        self.sendSearch('go', timeBudget, nodeBudget, workers)
+
+    '''
+    Ponders on the reply the principal variation of the last search predicts, to be called once its move is played
+    '''
+    def ponder(self, timeBudget=TIME_BUDGET, nodeBudget=NODE_BUDGET, workers=WORKERS):
+        if len(self.principalVariation) < 2:
+            return
+        self.ponderMove = self.principalVariation[1]
+        self.sendSearch('ponder', timeBudget, nodeBudget, workers, self.ponderMove)
+        self.searching = False #no answer is waited for until the ponder hit
+
+    def sendSearch(self, kind, *arguments):
+        while self.answeredId < self.searchId: #a cancelled search has to stop before the signals are cleared
+            self.receive()
+        self.stopSignal.clear()
+        self.ponderHitSignal.clear()
+        self.searchId += 1
+        self.searching = True
+        self.connection.send((kind, self.searchId) + arguments)
+
+    '''
+    The search running gives back the best move it has found so far, poll gets it like any other answer
+    '''
+    def moveNow(self):
+        if self.searching:
+            self.stopSignal.set()
+
+    '''
+    Stops the search running (or pondering) and drops its answer
+    '''
+    def cancel(self):
+        if self.searching or self.ponderMove is not None or self.ponderHit:
+            self.stopSignal.set()
+            self.searching = self.ponderHit = False
+            self.ponderMove = None
+
+    '''
+    True once the search started last is done, its move (packed, None without legal moves) is in bestMove.
+    Answers of cancelled searches are read and dropped
+    '''
+    def poll(self):
+        while self.answeredId < self.searchId and self.connection.poll():
+            searchId, move, pv = self.receive()
+            if searchId == self.searchId and self.searching:
+                self.bestMove, self.principalVariation = move, pv
+                self.searching = False
+                return True
+        return False
+
+    def receive(self):
+        kind, searchId, move, pv = self.connection.recv()
+        self.answeredId = searchId
+        return searchId, move, pv
+
+    def close(self):
+        self.stopSignal.set()
+        self.connection.send(('quit',))
+        self.process.join()
+
+'''
+Main loop of the AIWorker process. Messages are tuples: ('position', gs) the game to follow, ('move', packed),
+('order', order) and ('undo',) the game moving on, ('go', searchId, timeBudget, nodeBudget, workers) a search with
+findBestMoveParallel answered by ('done', searchId, packed best move, principal variation), ('ponder', searchId,
+timeBudget, nodeBudget, workers, packed reply) the same search after the reply (taken back afterwards), ('quit',).
+stopSignal (set by AIWorker.moveNow and cancel) stops the search running, ponderHitSignal starts the clock of a ponder
+search
+'''
+def runWorker(connection, stopSignal, ponderHitSignal):
+    gs = None
+    #kept for the whole game, so are its tables
+    context = SearchContext(transpositionTable, moveOrdering, stopSignal=stopSignal, ponderHitSignal=ponderHitSignal)
+    while True:
+        message = connection.recv()
+        kind = message[0]
+        if kind == 'position':
+            gs = message[1]
+        elif kind == 'move':
+            gs.makeMove(message[1])
+        elif kind == 'order':
+            gs.placeOrder(message[1])
+        elif kind == 'undo':
+            gs.undoMove()
+        elif kind == 'go':
+            searchId, timeBudget, nodeBudget, workers = message[1:]
+            bestMove, pv = findBestMoveParallel(gs, gs.getValidMoves(), None, timeBudget, nodeBudget, MAX_DEPTH,
+                                                workers, context)
+            connection.send(('done', searchId, bestMove.packed if bestMove is not None else None, pv))
+        elif kind == 'ponder':
+            searchId, timeBudget, nodeBudget, workers, reply = message[1:]
+            bestMove, pv = None, []
+            if reply in gs.getValidPackedMoves():
+                gs.makeMove(reply)
+                bestMove, pv = findBestMoveParallel(gs, gs.getValidMoves(), None, timeBudget, nodeBudget, MAX_DEPTH,
+                                                    workers, context, True)
+                gs.undoMove()
+            connection.send(('done', searchId, bestMove.packed if bestMove is not None else None, pv))
+        elif kind == 'quit':
+            break
+    closeWorkerPool()
+    connection.close()
 
 '''
 recursive function to find best move given the depth (how many moves forward we check
+the best move of the root (depth == context.searchDepth) goes to context.nextMove
 '''
-def findMoveMinMax(gs, validMoves, depth, WhiteToMove):
-    global nextMove
+def findMoveMinMax(gs, validMoves, depth, WhiteToMove, context):
     if depth == 0:
-        return scoreMaterial(gs.board)
+        return scoreMaterial(gs)
 
     if WhiteToMove:
         maxScore = -CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, False)
+            nextMoves = gs.getValidPackedMoves() if depth > 1 else None #the leaves only get scored
+            score = findMoveMinMax(gs, nextMoves, depth - 1, False, context)
             if score > maxScore:
                 maxScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                if depth == context.searchDepth:
+                    context.nextMove = move
             gs.undoMove()
         return maxScore
     else:
         minScore = CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
-            nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, True)
+            nextMoves = gs.getValidPackedMoves() if depth > 1 else None #the leaves only get scored
+            score = findMoveMinMax(gs, nextMoves, depth - 1, True, context)
             if score < minScore:
                 minScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                if depth == context.searchDepth:
+                    context.nextMove = move
             gs.undoMove()
         return minScore
 
@@ -157,8 +719,7 @@ def findMoveMinMax(gs, validMoves, depth, WhiteToMove):
 We're always looking for the max move for the player that is doing said move,
 which means that we start at the top looking for max then one layer below looking for min and so on
 '''
-def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
-    global nextMove
+def findMoveNegaMax(gs, validMoves, depth, turnMultiplier, context):
     if depth == 0:
         #turn multiplier is opposite to self if the depth is odd
         return turnMultiplier * scoreBoard(gs)
@@ -166,47 +727,222 @@ def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
     maxScore = -CHECKMATE
     for move in validMoves:
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMax(gs, nextMoves, depth-1, -turnMultiplier) #recursion but on negative because its enemys turn
+        nextMoves = gs.getValidPackedMoves() if depth > 1 else None #the leaves only get scored
+        score = -findMoveNegaMax(gs, nextMoves, depth-1, -turnMultiplier, context) #recursion but on negative because its enemys turn
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
-                nextMove = move
+            if depth == context.searchDepth:
+                context.nextMove = move
         gs.undoMove()
     return maxScore
 
 '''
-same as above but with alpha beta pruning
+same as above but with alpha beta pruning, ply is the distance from the root (every move and null move made since,
+whatever the reductions did to depth), it indexes the killers. Positions already searched deep enough are looked up
+in the transposition table (not at the root, nextMove has to be found there), validMoves is None below the root and
+the moves are generated only when the table didn't settle the position. Mate scores are CHECKMATE less the ply of
+the mate, so the quicker mate scores better; they go in the table counted from the position (scoreToTable).
+Principal variation search: the first (best ordered) move is searched with the whole window, the others with a null
+window just above alpha to prove they are no better; one that turns out better is searched again with the whole
+window. pvLine (a list, None in the null window searches) gets the best line found from the position.
+Null move pruning: away from the principal variation, if the side to move could pass (GameState.makeNullMove) and
+a search NULL_MOVE_REDUCTION shallower still gets beta, the node is cut off. Not in check, not with only the king and
+pawns left (zugzwang) and never twice in a row (allowNull).
+Late move reductions: quiet moves after the first LMR_FULL_MOVES (no captures, promotions, killers or checks) are
+searched shallower, the later and the deeper the more; one that still beats alpha is searched again to the full
+depth.
+Once the budgets of findBestMove run out context.searchStopped is set and every node returns 0 at once.
+At depth 0 the captures are searched on by findMoveQuiescence
 '''
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, ply, alpha, beta, turnMultiplier, context, pvLine=None,
+                             allowNull=True):
+    if depth <= 0: #reductions can go past 0
+        return findMoveQuiescence(gs, ply, alpha, beta, turnMultiplier, context)
+    if context.countNode():
+        return 0
+
+    alphaOrig, betaOrig = alpha, beta #the bound of the result is told by the window the node was given
+    key = gs.zobristKey
+    entry = context.transpositionTable.probe(key)
+    if entry is not None and entry[1] >= depth and ply > 0:
+        bound, score = entry[2], scoreFromTable(entry[3], ply)
+        if bound == EXACT:
+            return score
+        if bound == LOWERBOUND:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if alpha >= beta:
+            return score
+    inCheck = gs.kingInCheck()
+    staticScore = None if inCheck else turnMultiplier * scorePosition(gs)
+    #a stalemate isn't worth the static score, hasAnyLegalMove is only asked once the node would be cut off
+    if pvLine is None and not inCheck and depth <= 3 and abs(beta) < MATE_BOUND and \
+            staticScore - REVERSE_FUTILITY_MARGIN * depth >= beta and gs.hasAnyLegalMove():
+        return staticScore
+    if allowNull and pvLine is None and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and not zugzwangProne(gs) and \
+            staticScore >= beta and gs.hasAnyLegalMove():
+        nullDepth = depth - 1 - NULL_MOVE_REDUCTION - (depth >= 6) #a ply more off the deep searches
+        gs.makeNullMove()
+        score = -findMoveNegaMaxAlphaBeta(gs, None, nullDepth, ply + 1, -beta, -beta + NULL_WINDOW, -turnMultiplier,
+                                          context, None, False)
+        gs.undoNullMove()
+        if context.searchStopped:
+            return 0
+        if score >= beta:
+            context.nullMoveCutoffs += 1
+            return score if score < MATE_BOUND else beta #a mate found after passing is no proof
+    if validMoves is None:
+        validMoves = gs.getValidPackedMoves()
+    if not validMoves:
+        return -CHECKMATE + ply if inCheck else STALEMATE
+    killers = context.moveOrdering.killers[ply]
+    validMoves = context.moveOrdering.orderMoves(gs, validMoves, ply, entry[4] if entry is not None else None)
+
+    futileScore = None #quiet moves can't bring the score up to alpha
+    if pvLine is None and not inCheck and depth <= 2 and abs(alpha) < MATE_BOUND and \
+            staticScore + FUTILITY_MARGIN * depth <= alpha:
+        futileScore = staticScore + FUTILITY_MARGIN * depth
 
-    #move ordering - implement later
     maxScore = -CHECKMATE
-    for move in validMoves:
+    bestMove = None
+    childLine = None
+    for i, move in enumerate(validMoves):
+        if futileScore is not None and i > 0 and not move & (MOVE_CAPTURE | MOVE_PROMOTION):
+            maxScore = max(maxScore, futileScore)
+            continue
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
+        if pvLine is not None:
+            childLine = []
         #alpha and beta change places and once they meet the branch is cut
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth-1, -beta, -alpha, -turnMultiplier)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-                print(move.moveID, score)
+        if i == 0:
+            score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1, ply+1, -beta, -alpha, -turnMultiplier, context,
+                                              childLine)
+        else:
+            reduction = 0
+            if i >= LMR_FULL_MOVES and depth >= LMR_MIN_DEPTH and not inCheck and \
+                    not move & (MOVE_CAPTURE | MOVE_PROMOTION) and move not in killers and not gs.kingInCheck():
+                reduction = LMR_REDUCTIONS[depth][min(i, MAX_MOVES - 1)]
+                context.reductions += 1
+            context.nullWindowSearches += 1
+            score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1-reduction, ply+1, -alpha - NULL_WINDOW, -alpha,
+                                              -turnMultiplier, context)
+            if reduction and score > alpha and not context.searchStopped: #the reduction didn't prove the move worse
+                context.reductionResearches += 1
+                score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1, ply+1, -alpha - NULL_WINDOW, -alpha,
+                                                  -turnMultiplier, context)
+            if alpha < score < beta and not context.searchStopped: #better than the moves before, needs the real score
+                context.researches += 1
+                score = -findMoveNegaMaxAlphaBeta(gs, None, depth-1, ply+1, -beta, -alpha, -turnMultiplier, context,
+                                                  childLine)
         gs.undoMove()
+        if context.searchStopped:
+            return 0
+        if score > maxScore or bestMove is None: #the root has a move to give back even if every move gets mated
+            maxScore = score
+            bestMove = move
+            if ply == 0:
+                context.nextMove = move
         if maxScore > alpha: #pruning happens
             alpha = maxScore
+            if pvLine is not None:
+                pvLine[:] = [move] + childLine
+        if alpha >= beta:
+            context.moveOrdering.addCutoff(gs, move, ply, depth)
+            break
+    if maxScore <= alphaOrig:
+        bound = UPPERBOUND
+    elif maxScore >= betaOrig:
+        bound = LOWERBOUND
+    else:
+        bound = EXACT
+    context.transpositionTable.store(key, depth, bound, scoreToTable(maxScore, ply), bestMove)
+    return maxScore
+
+'''
+Quiescence search: only captures are searched on, so the search doesn't stop in the middle of an exchange.
+The side to move can stand pat (keep the score of the position instead of capturing), and a capture that couldn't
+bring the score up to alpha even with DELTA_MARGIN more is skipped (delta pruning), so is a losing capture (see
+losingCapture). In check every evasion is searched and there's no standing pat. A stalemate is only looked for
+(GameState.hasAnyLegalMove) when the side to move has nothing but its king and pawns, where stalemates come up;
+otherwise it is scored like the position. ply scores the mate like in findMoveNegaMaxAlphaBeta.
+The results go in the transposition table with depth 0, the main search only takes its move order from them
+'''
+def findMoveQuiescence(gs, ply, alpha, beta, turnMultiplier, context):
+    if context.countNode():
+        return 0
+    alphaOrig = alpha
+    key = gs.zobristKey
+    entry = context.transpositionTable.probe(key) #any entry is deep enough, the captures transpose a lot
+    if entry is not None:
+        bound, score = entry[2], scoreFromTable(entry[3], ply)
+        if bound == EXACT or bound == LOWERBOUND and score >= beta or bound == UPPERBOUND and score <= alpha:
+            return score
+    if gs.kingInCheck():
+        standPat = None
+        maxScore = -CHECKMATE
+        moves = gs.getValidPackedMoves()
+        if not moves:
+            return -CHECKMATE + ply
+    else:
+        if zugzwangProne(gs) and not gs.hasAnyLegalMove():
+            return STALEMATE
+        standPat = maxScore = turnMultiplier * scorePosition(gs)
+        if standPat >= beta:
+            return standPat
+        alpha = max(alpha, standPat)
+        moves = gs.getValidPackedCaptures()
+    for move in context.moveOrdering.orderCaptures(gs, moves):
+        if standPat is not None and not move & MOVE_PROMOTION and \
+                (standPat + MoveOrdering.VALUES[capturedType(move)] + DELTA_MARGIN <= alpha or losingCapture(gs, move)):
+            continue
+        gs.makeMove(move)
+        score = -findMoveQuiescence(gs, ply + 1, -beta, -alpha, -turnMultiplier, context)
+        gs.undoMove()
+        if context.searchStopped:
+            return 0
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
         if alpha >= beta:
             break
+    if maxScore <= alphaOrig:
+        bound = UPPERBOUND
+    elif maxScore >= beta:
+        bound = LOWERBOUND
+    else:
+        bound = EXACT
+    if entry is None or entry[1] == 0: #not over a main search entry of the position
+        context.transpositionTable.store(key, 0, bound, scoreToTable(maxScore, ply), None)
     return maxScore
 
 '''
-A positive score is good for white and negative is good for black
+A capture by a piece worth more than its victim onto a square the other side defends (GameState.squareAttacked),
+the piece is lost for less
+'''
+def losingCapture(gs, move):
+    attacker = MoveOrdering.VALUES[gs.squares[move & 63] & TYPE_MASK]
+    return attacker > MoveOrdering.VALUES[capturedType(move)] and \
+        gs.squareAttacked(move >> 6 & 63, BLACK if gs.WhiteToMove else WHITE)
+
+'''
+Only the king and pawns left to the side to move - passing could be its best move, so a null move proves nothing
+'''
+def zugzwangProne(gs):
+    allyColor = WHITE if gs.WhiteToMove else BLACK
+    for sq in maskSquares(gs.pieceSquares[allyColor]):
+        if gs.squares[sq] & TYPE_MASK not in (PAWN, KING):
+            return False
+    return True
+
+'''
+A positive score is good for white and negative is good for black. Material and the positional scores are running
+totals of the GameState (see GameState.setSquare), so only the end of the game has to be looked for here,
+GameState.hasAnyLegalMove stops at the first legal move it finds. Mobility is added by scorePosition
 '''
 def scoreBoard(gs):
-    if len(gs.getValidMoves()) == 0:
+    if not gs.hasAnyLegalMove():
         if gs.inCheck:
             if gs.WhiteToMove:
                 return -CHECKMATE #black wins
@@ -215,49 +951,17 @@ def scoreBoard(gs):
         else:
             return STALEMATE
 
+    return scorePosition(gs)
 
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                #score it positionally
-                piecePositionScore = 0
-                if square[1] != "K":
-                    if square[1] == "P":
-                        piecePositionScore = piecePositionScores[square[0:2]][row][col]
-                    else:
-                        piecePositionScore = piecePositionScores[square[1]][row][col]
-
-                if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .1
-                elif square[0] == 'b':
-                    score -= pieceScore[square[1]] + piecePositionScore * .1
-
-    return score
-
-
-
-
+'''
+Material, positional and mobility score without looking for the end of the game
+'''
+def scorePosition(gs):
+    return gs.materialScore + gs.positionScore * .1 + MOBILITY_WEIGHT * (gs.getMobility(WHITE) - gs.getMobility(BLACK))
 
 
 '''
 Score the board based on material.
 '''
-def scoreMaterial(board):
-    score = 0
-    for row in board:
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScore[square[1]]
-            elif square[0] == 'b':
-                score -= pieceScore[square[1]]
-
-    return score
-
-
-
-
-
-
-
+def scoreMaterial(gs):
+    return gs.materialScore